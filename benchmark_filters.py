@@ -0,0 +1,223 @@
+"""
+Offline benchmark of the word filter and the raid phrase check, through their public entry
+points in utils.mod.filter. It doesn't need a database or a Discord connection: the Guild
+snapshot and members are stand-ins, and synthetic filter lists (literal, regex and glob
+entries) and messages are generated from a fixed seed, so runs on different commits measure
+the same work and can be compared. On commits from before regex and glob entries existed,
+those entries are matched as literals, and the raid phrase check is skipped on commits
+without find_triggered_raid_phrases.
+
+    python benchmark_filters.py
+    python benchmark_filters.py --sizes 100 1000 --messages 2000 --json results.json
+"""
+
+import argparse
+import asyncio
+import inspect
+import json
+import os
+import platform
+import random
+import statistics
+import string
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+# IDs of the stand-in guild and its roles
+GUILD_ID = 1
+OWNER_ID = 2
+ROLES = {1: 11, 2: 12, 3: 13}
+
+LATIN_HOMOGLYPHS = {"a": "а", "c": "с", "e": "е", "o": "о", "p": "р", "x": "х", "y": "у", "k": "к", "h": "н"}
+ACCENTED = {"a": "áàâä", "e": "éèêë", "i": "íìîï", "o": "óòôö", "u": "úùûü", "n": "ñ", "c": "ç"}
+EMOJI = ["😂", "🔥", "👍", "💀", "🙏", "✨", "❤️"]
+FILLER = ("the is it to and a of you that for on my have this with but chromebook linux crostini "
+          "update chrome os does anyone know how why when works install android app battery").split()
+
+
+def random_word(rng: random.Random, min_length: int = 3, max_length: int = 12) -> str:
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(min_length, max_length)))
+
+
+def make_entry(rng: random.Random) -> SimpleNamespace:
+    """A stand-in for FilterWord. `sample` is a text the entry matches, for the messages to contain."""
+
+    first, second = random_word(rng), random_word(rng)
+    roll = rng.random()
+    if roll < 0.03:
+        digits = "".join(rng.choice(string.digits) for _ in range(rng.randint(1, 4)))
+        kind, word, sample = "regex", rf"{first}[\s._-]?{second}\d{{1,4}}", f"{first}.{second}{digits}"
+    elif roll < 0.06:
+        kind, word, sample = "glob", f"{first}*{second}", f"{first}{random_word(rng, 0, 5)}{second}"
+    else:
+        kind = "literal"
+        word = first
+        if rng.random() < 0.15:
+            word = f"{word} {second}"
+        if rng.random() < 0.05:
+            word = f"{word}.{rng.choice(['com', 'gg', 'ru'])}"
+        sample = word
+
+    return SimpleNamespace(
+        word=word,
+        kind=kind,
+        sample=sample,
+        false_positive=kind == "literal" and rng.random() < 0.1,
+        notify=rng.random() < 0.2,
+        bypass=rng.choice([1, 1, 2, 3, 5]),
+    )
+
+
+def disguise(rng: random.Random, word: str) -> str:
+    """Apply one of the tricks used to sneak a word past the filter."""
+
+    trick = rng.randrange(4)
+    if trick == 0:
+        return "".join(LATIN_HOMOGLYPHS.get(char, char) for char in word)
+    elif trick == 1:
+        return " ".join(word)
+    elif trick == 2:
+        return ".".join(word)
+    return "".join(rng.choice(ACCENTED[char]) if char in ACCENTED and rng.random() < 0.5 else char for char in word)
+
+
+def make_message(rng: random.Random, words: list) -> str:
+    # mostly short chat messages, sometimes a wall of text
+    length = int(min(rng.lognormvariate(3.5, 1.0), 4000))
+    parts = []
+    while sum(len(part) + 1 for part in parts) < length:
+        roll = rng.random()
+        if roll < 0.02 and words:
+            parts.append(disguise(rng, rng.choice(words).sample))
+        elif roll < 0.05:
+            parts.append(rng.choice(EMOJI))
+        elif roll < 0.10:
+            parts.append(disguise(rng, rng.choice(FILLER)))
+        else:
+            parts.append(rng.choice(FILLER))
+    return rng.choice([" ", "  ", "\n", "\t"]).join(parts) or rng.choice(FILLER)
+
+
+def make_member(rng: random.Random, guild: SimpleNamespace) -> SimpleNamespace:
+    # mostly whitenames, some with roles
+    level = rng.choice([0] * 8 + [1, 2])
+    roles = [guild.get_role(ROLES[level])] if level else []
+    return SimpleNamespace(id=rng.randrange(10**17, 10**18), guild=guild, roles=roles, level=level)
+
+
+def percentile(samples: list, fraction: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+async def call(check, *args):
+    # the entry points are coroutines on newer commits
+    result = check(*args)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+async def run(name: str, check, messages: list, members: list) -> dict:
+    # the first call compiles the filter list on commits that do that
+    start = time.perf_counter()
+    await call(check, "warm up", members[0])
+    compile_ms = (time.perf_counter() - start) * 1000
+    for level in sorted({member.level for member in members}):
+        await call(check, "warm up", next(member for member in members if member.level == level))
+
+    latencies = []
+    hits = 0
+    start = time.perf_counter()
+    for message, member in zip(messages, members):
+        message_start = time.perf_counter()
+        if await call(check, message, member):
+            hits += 1
+        latencies.append(time.perf_counter() - message_start)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "check": name,
+        "compile_ms": compile_ms,
+        "messages_per_second": len(messages) / elapsed,
+        "p50_us": percentile(latencies, 0.5) * 1e6,
+        "p99_us": percentile(latencies, 0.99) * 1e6,
+        "mean_us": statistics.mean(latencies) * 1e6,
+        "hits": hits,
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return "unknown"
+
+
+def load_checks(snapshot: SimpleNamespace) -> dict:
+    """Import the filter entry points with the stand-in Guild snapshot in place of the database."""
+
+    os.environ.setdefault("MAIN_GUILD_ID", str(GUILD_ID))
+    os.environ.setdefault("GUILD_OWNER_ID", str(OWNER_ID))
+    # the bot's logger parses the command line when it's imported
+    sys.argv = sys.argv[:1]
+
+    from data.services.guild_service import guild_service
+    guild_service.get_guild = lambda: snapshot
+
+    from utils.mod import filter
+
+    checks = {"filter": filter.find_triggered_filters}
+    if hasattr(filter, "find_triggered_raid_phrases"):
+        from utils.mod.normalize import normalize
+        checks["raid_phrase"] = lambda message, member: filter.find_triggered_raid_phrases(normalize(message), member)
+    return checks
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark the word filter and raid phrase check")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000], help="filter list sizes to test")
+    parser.add_argument("--messages", type=int, default=5000, help="number of messages per run")
+    parser.add_argument("--seed", type=int, default=1337, help="seed for the synthetic data")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    snapshot = SimpleNamespace(filter_words=[], raid_phrases=[], role_nerds=ROLES[1], role_moderator=ROLES[2], role_administrator=ROLES[3])
+    checks = load_checks(snapshot)
+    roles = {role_id: SimpleNamespace(id=role_id) for role_id in ROLES.values()}
+    guild = SimpleNamespace(id=GUILD_ID, owner=None, get_role=roles.get)
+
+    results = []
+    print(f"{'check':<12} {'entries':>8} {'compile ms':>11} {'msg/s':>10} {'p50 us':>9} {'p99 us':>9} {'hits':>6}")
+    for size in args.sizes:
+        rng = random.Random(f"{args.seed}-{size}")
+        words = [make_entry(rng) for _ in range(size)]
+        messages = [make_message(rng, words) for _ in range(args.messages)]
+        members = [make_member(rng, guild) for _ in messages]
+        # new lists, so the entry points see a changed snapshot
+        snapshot.filter_words = list(words)
+        snapshot.raid_phrases = list(words)
+
+        for name, check in checks.items():
+            result = await run(name, check, messages, members)
+            result.update(entries=size)
+            results.append(result)
+            print(f"{name:<12} {size:>8} {result['compile_ms']:>11.1f} {result['messages_per_second']:>10.0f} "
+                  f"{result['p50_us']:>9.1f} {result['p99_us']:>9.1f} {result['hits']:>6}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "revision": git_revision(),
+                "python": platform.python_version(),
+                "seed": args.seed,
+                "messages": args.messages,
+                "checks": list(checks),
+                "results": results,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
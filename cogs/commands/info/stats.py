@@ -12,7 +12,9 @@ from math import floor
 from data.services.user_service import user_service
 from utils.config import cfg
 from utils.logger import logger
+from utils.mod.filter import verdict_caches
 from utils.context import ChromeyContext
+from utils.database import db
 from utils.permissions.checks import PermissionsFailure, mod_and_up, whisper
 from utils.permissions.slash_perms import slash_perms
 
@@ -91,6 +93,19 @@ class Stats(commands.Cog):
                         value=f"{floor(process.memory_info().rss/1000/1000)} MB")
         embed.add_field(name="Python Version", value=platform.python_version())
 
+        user_cache = user_service.user_cache
+        embed.add_field(name="User Cache",
+                        value=f"{len(user_cache)} users, {floor(user_cache.hit_rate*100)}% hits ({user_cache.hits}/{user_cache.hits + user_cache.misses})")
+        verdicts = verdict_caches["filter_words"]
+        embed.add_field(name="Filter Verdict Cache",
+                        value=f"{len(verdicts)} texts, {floor(verdicts.hit_rate*100)}% hits ({verdicts.hits}/{verdicts.hits + verdicts.misses})")
+        embed.add_field(name="Database Pool",
+                        value=f"{db.pool_metrics.in_use}/{db.pool_metrics.open} connections in use (max {db.max_pool_size})")
+
+        stages = "\n".join(f"{stage.name}: {stage.average_time*1000:.2f}ms avg, {stage.max_time*1000:.0f}ms max ({stage.calls} runs)" for stage in self.bot.moderation.stages)
+        if stages:
+            embed.add_field(name="Moderation Pipeline", value=stages, inline=False)
+
         await ctx.respond(embed=embed, ephemeral=ctx.whisper)
 
     @whisper()
@@ -130,7 +145,7 @@ class Stats(commands.Cog):
 
         embed = discord.Embed(title="Raid Statistics",
                               color=discord.Color.blurple())
-        raids = user_service.fetch_raids()
+        raids = await user_service.fetch_raids()
 
         total = 0
         for raid_type, cases in raids.items():
@@ -154,7 +169,7 @@ class Stats(commands.Cog):
         embed.set_author(name=f"{mod}'s case statistics",
                          icon_url=mod.display_avatar)
 
-        raids = user_service.fetch_cases_by_mod(mod.id)
+        raids = await user_service.fetch_cases_by_mod(mod.id)
         embed.add_field(name="Total cases", value=raids.get("total"))
 
         string = ""
@@ -55,7 +55,7 @@ class Tags(commands.Cog):
 
         """
         name = name.lower()
-        tag = guild_service.get_tag_by_name(name, bool(args))
+        tag = await guild_service.get_tag_by_name(name, bool(args))
         if tag is None:
             raise commands.BadArgument("That tag does not exist.")
         
@@ -83,7 +83,7 @@ class Tags(commands.Cog):
         """List all tags
         """
 
-        _tags = sorted(guild_service.get_guild().tags, key=lambda tag: tag.name)
+        _tags = await guild_service.all_tags()
 
         if len(_tags) == 0:
             raise commands.BadArgument("There are no tags defined.")
@@ -111,7 +111,7 @@ class Tags(commands.Cog):
         # always store command name as lowercase for case insensitivity
         command_name = command_name.lower()
 
-        res = sorted(guild_service.get_guild().tags, key=lambda tag: tag.name)
+        res = await guild_service.all_tags()
         match = [ command for command in res if command_name in command.name ]
 
         if len(match) == 0:
@@ -145,7 +145,7 @@ class Tags(commands.Cog):
             raise commands.BadArgument(
                 "Tag names can't be longer than 1 word.")
 
-        if (guild_service.get_tag_by_name(name.lower(), args)) is not None:
+        if (await guild_service.get_tag_by_name(name.lower(), args)) is not None:
             raise commands.BadArgument("Tag with that name already exists.")
 
         await ctx.defer(ephemeral=True)
@@ -183,7 +183,7 @@ class Tags(commands.Cog):
             tag.image.put(image, content_type=_type)
 
         # store tag in database
-        guild_service.add_tag(tag)
+        await guild_service.add_tag(tag)
 
         _file = tag.image.read()
         if _file is not None:
@@ -208,14 +208,14 @@ class Tags(commands.Cog):
 
         """
 
-        tag = guild_service.get_tag(_id)
+        tag = await guild_service.get_tag(_id)
         if tag is None:
             raise commands.BadArgument("That tag does not exist.")
 
         if tag.image is not None:
             tag.image.delete()
 
-        guild_service.remove_tag(_id)
+        await guild_service.remove_tag(_id)
         await ctx.send_warning(f"Deleted tag `{tag.name}`.", delete_after=5)
 
     async def prepare_tag_embed(self, tag):
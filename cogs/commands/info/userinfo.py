@@ -38,7 +38,6 @@ def format_cases_page(ctx, entries, current_page, all_pages):
     page_count = 0
 
     user = ctx.case_user
-    u = user_service.get_user(user.id)
 
     for page in all_pages:
         for case in page:
@@ -199,7 +198,7 @@ class UserInfo(commands.Cog):
                 f"You don't have permissions to check others' cases.")
 
         # fetch user's cases from our database
-        results = user_service.get_cases(user.id)
+        results = await user_service.get_cases(user.id)
         if len(results.cases) == 0:
             return await ctx.send_warning(f'{user.mention} has no cases.', delete_after=5)
 
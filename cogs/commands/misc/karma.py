@@ -1,4 +1,3 @@
-import datetime
 import traceback
 import typing
 
@@ -14,34 +13,49 @@ from utils.permissions.checks import PermissionsFailure, mod_and_up, nerds_and_u
 from utils.permissions.slash_perms import slash_perms
 from utils.views.menu import Menu
 
-def format_history_page(ctx, entries, current_page, all_pages):
+# karma history entries per page
+HISTORY_PAGE_SIZE = 10
+
+def history_pages(count: int) -> list:
+    """The (skip, limit) of each page of a karma history with `count` entries.
+    The pages are given to Menu as its entries, one per page, and the page formatter
+    fetches the events of its page from the ledger.
+    """
+
+    return [(skip, HISTORY_PAGE_SIZE) for skip in range(0, count, HISTORY_PAGE_SIZE)]
+
+async def format_history_page(ctx, entries, current_page, all_pages):
     embed = discord.Embed(
         title='History', color=discord.Color(value=0xfcba03))
-    for v in entries:
-        invoker_text = f"<@{v['from']}>"
+    skip, limit = entries[0]
+    events = await user_service.karma_history(ctx.invokee.id, received=True, skip=skip, limit=limit)
+    for v in events:
+        invoker_text = f"<@{v.from_id}>"
 
-        if v["amount"] < 0:
+        if v.amount < 0:
             embed.add_field(
-                name=f'{humanize.naturaltime(v["date"])}', value=f'{invoker_text} took {v["amount"]} karma from {ctx.invokee.mention}\n**Reason**: {v["reason"]}', inline=False)
+                name=f'{humanize.naturaltime(v.date)}', value=f'{invoker_text} took {v.amount} karma from {ctx.invokee.mention}\n**Reason**: {v.reason}', inline=False)
         else:
             embed.add_field(
-                name=f'{humanize.naturaltime(v["date"])}', value=f'{invoker_text} gave {v["amount"]} karma to {ctx.invokee.mention}\n**Reason**: {v["reason"]}', inline=False)
+                name=f'{humanize.naturaltime(v.date)}', value=f'{invoker_text} gave {v.amount} karma to {ctx.invokee.mention}\n**Reason**: {v.reason}', inline=False)
     
     embed.set_footer(text=f'Page {current_page}/{len(all_pages)}')
     return embed
 
-def format_modhistory_page(ctx, entries, current_page, all_pages):
+async def format_modhistory_page(ctx, entries, current_page, all_pages):
     embed = discord.Embed(
         title='History', color=discord.Color(value=0xfcba03))
-    for v in entries:
-        target = f"<@{v['to']}>"
+    skip, limit = entries[0]
+    events = await user_service.karma_history(ctx.invoker.id, received=False, skip=skip, limit=limit)
+    for v in events:
+        target = f"<@{v.to_id}>"
 
-        if v["amount"] < 0:
+        if v.amount < 0:
             embed.add_field(
-                name=f'{humanize.naturaltime(v["date"])}', value=f'{ctx.invoker} took {v["amount"]} karma from {target}\n**Reason**: {v["reason"]}', inline=False)
+                name=f'{humanize.naturaltime(v.date)}', value=f'{ctx.invoker} took {v.amount} karma from {target}\n**Reason**: {v.reason}', inline=False)
         else:
             embed.add_field(
-                name=f'{humanize.naturaltime(v["date"])}', value=f'{ctx.invoker} gave {v["amount"]} karma to {target}\n**Reason**: {v["reason"]}', inline=False)
+                name=f'{humanize.naturaltime(v.date)}', value=f'{ctx.invoker} gave {v.amount} karma to {target}\n**Reason**: {v.reason}', inline=False)
     
     embed.set_footer(text=f'Page {current_page}/{len(all_pages)}')
     return embed
@@ -90,7 +104,7 @@ class Karma(commands.Cog):
                 raise commands.BadArgument(
                     f"Couldn't find user with ID {member}")
 
-        karma, rank, overall = user_service.karma_rank(member.id)
+        karma, rank, overall = await user_service.karma_rank(member.id)
 
         embed = discord.Embed(
             title=f"Karma results", color=discord.Color(value=0x37b83b))
@@ -120,14 +134,12 @@ class Karma(commands.Cog):
             "Karma value"
         """
 
-        m = user_service.get_user(member.id)
-        m.karma = val
-        m.save()
+        await user_service.set_karma(member.id, val)
 
         embed = discord.Embed(title=f"Updated {member}'s karma!",
                               color=discord.Color(value=0x37b83b))
         embed.description = ""
-        embed.description += f'**Current karma**: {m.karma}\n'
+        embed.description += f'**Current karma**: {val}\n'
         embed.set_footer(
             text=f'Requested by {ctx.author}', icon_url=ctx.author.display_avatar)
         await ctx.respond(member.mention, embed=embed)
@@ -164,33 +176,14 @@ class Karma(commands.Cog):
             raise commands.BadArgument(
                 "You can't give yourself karma")
 
-        receiver = user_service.get_user(member.id)
-        receive_action = {
-            "amount": val,
-            "from": ctx.author.id,
-            "date": datetime.datetime.now(),
-            "reason": reason
-        }
-        receiver.karma += val
-        receiver.karma_received_history.append(receive_action)
-        receiver.save()
-
-        giver = user_service.get_user(ctx.author.id)
-        give_action = {
-            "amount": val,
-            "to": member.id,
-            "date": datetime.datetime.now(),
-            "reason": reason
-        }
-        giver.karma_given_history.append(give_action)
-        giver.save()
+        karma = await user_service.add_karma(ctx.author.id, member.id, val, reason)
 
         embed = discord.Embed(title=f"Updated {member.name}#{member.discriminator}'s karma!",
                               color=discord.Color(value=0x37b83b))
         embed.description = ""
 
         embed.description += f'**Karma given**: {val}\n'
-        embed.description += f'**Current karma**: {receiver.karma}\n'
+        embed.description += f'**Current karma**: {karma}\n'
         embed.description += f'**Reason**: {reason}'
         embed.set_footer(
             text=f'Requested by {ctx.author}', icon_url=ctx.author.display_avatar)
@@ -230,33 +223,14 @@ class Karma(commands.Cog):
 
         val = (-1) * val
 
-        receiver = user_service.get_user(member.id)
-        receive_action = {
-            "amount": val,
-            "from": ctx.author.id,
-            "date": datetime.datetime.now(),
-            "reason": reason
-        }
-        receiver.karma += val
-        receiver.karma_received_history.append(receive_action)
-        receiver.save()
-
-        giver = user_service.get_user(ctx.author.id)
-        give_action = {
-            "amount": val,
-            "to": member.id,
-            "date": datetime.datetime.now(),
-            "reason": reason
-        }
-        giver.karma_given_history.append(give_action)
-        giver.save()
+        karma = await user_service.add_karma(ctx.author.id, member.id, val, reason)
 
         embed = discord.Embed(title=f"Updated {member.name}#{member.discriminator}'s karma!",
                               color=discord.Color(value=0x37b83b))
         embed.description = ""
 
         embed.description += f'**Karma taken**: {(-1) * val}\n'
-        embed.description += f'**Current karma**: {receiver.karma}\n'
+        embed.description += f'**Current karma**: {karma}\n'
         embed.description += f'**Reason**: {reason}'
         embed.set_footer(
             text=f'Requested by {ctx.author}', icon_url=ctx.author.display_avatar)
@@ -277,13 +251,14 @@ class Karma(commands.Cog):
             "Member whose karma history to get"
         """
 
-        data = sorted(user_service.get_user(member.id).karma_received_history, key=lambda d: d['date'], reverse=True)
+        # pages are fetched from the ledger by the page formatter, so we only need to know how many entries there are
+        data = history_pages(await user_service.karma_history_count(member.id, received=True))
 
         if not data:
             raise commands.BadArgument("This user had no history.")
         
         ctx.invokee = member
-        menu = Menu(ctx, data, per_page=10, page_formatter=format_history_page, whisper=False)
+        menu = Menu(ctx, data, per_page=1, page_formatter=format_history_page, whisper=False)
         await menu.start()
 
     @nerds_and_up()
@@ -301,13 +276,13 @@ class Karma(commands.Cog):
             Member whose karma history to get
         """
 
-        data = sorted(user_service.get_user(mod.id).karma_given_history, key=lambda d: d['date'], reverse=True)
+        data = history_pages(await user_service.karma_history_count(mod.id, received=False))
 
         if not data:
             raise commands.BadArgument("This user had no history.")
 
         ctx.invoker = mod
-        menu = Menu(ctx, data, per_page=10, page_formatter=format_modhistory_page, whisper=False)
+        menu = Menu(ctx, data, per_page=1, page_formatter=format_modhistory_page, whisper=False)
         await menu.start()
 
     @discord.slash_command(guild_ids=[cfg.guild_id], description="View karma leaderboard")
@@ -315,7 +290,7 @@ class Karma(commands.Cog):
         """Get karma leaderboard for the server
         """
 
-        data = user_service.leaderboard()
+        data = await user_service.leaderboard()
 
         if not data:
             raise commands.BadArgument("No history in this guild!")
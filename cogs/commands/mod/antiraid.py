@@ -35,7 +35,7 @@ class AntiRaid(commands.Cog):
 
         # these are phrases that when said by a whitename, automatically bans them.
         # for example: known scam URLs
-        done = guild_service.add_raid_phrase(phrase)
+        done = await guild_service.add_raid_phrase(phrase)
         if not done:
             raise commands.BadArgument("That phrase is already in the list.")
         else:
@@ -99,7 +99,7 @@ class AntiRaid(commands.Cog):
         if do_add:
             async with ctx.typing():
                 for phrase in new_phrases:
-                    guild_service.add_raid_phrase(phrase)
+                    await guild_service.add_raid_phrase(phrase)
 
             await ctx.send_success(f"Added {len(new_phrases)} phrases to the raid filter.")
         else:
@@ -128,7 +128,7 @@ class AntiRaid(commands.Cog):
         words = list(filter(lambda w: w.word.lower() == word.lower(), words))
 
         if len(words) > 0:
-            guild_service.remove_raid_phrase(words[0].word)
+            await guild_service.remove_raid_phrase(words[0].word)
             await ctx.send_success("Deleted!", delete_after=5)
         else:
             raise commands.BadArgument("That word is not a raid phrase.")
@@ -152,7 +152,7 @@ class AntiRaid(commands.Cog):
         if mode is None:
             mode = not guild_service.get_guild().ban_today_spam_accounts
 
-        guild_service.set_spam_mode(mode)
+        await guild_service.set_spam_mode(mode)
         await ctx.send_success(description=f"We {'**will ban**' if mode else 'will **not ban**'} accounts created today in join spam filter.")
 
     @admin_and_up()
@@ -173,13 +173,13 @@ class AntiRaid(commands.Cog):
             
         """
 
-        profile = user_service.get_user(user.id)
+        profile = await user_service.get_user(user.id)
         if mode is None:
             profile.raid_verified = not profile.raid_verified
         else:
             profile.raid_verified = mode
 
-        profile.save()
+        await user_service.save_user(profile)
 
         await ctx.send_success(description=f"{'**Verified**' if profile.raid_verified else '**Unverified**'} user {user.mention}.")
 
@@ -246,7 +246,7 @@ class AntiRaid(commands.Cog):
         if channel.id in guild_service.get_locked_channels():
             raise commands.BadArgument("That channel is already lockable.")
         
-        guild_service.add_locked_channels(channel.id)
+        await guild_service.add_locked_channels(channel.id)
         await ctx.send_success(f"Added {channel.mention} as lockable channel!")
 
     @admin_and_up()
@@ -256,7 +256,7 @@ class AntiRaid(commands.Cog):
         if channel.id not in guild_service.get_locked_channels():
             raise commands.BadArgument("That channel isn't already lockable.")
         
-        guild_service.remove_locked_channels(channel.id)
+        await guild_service.remove_locked_channels(channel.id)
         await ctx.send_success(f"Removed {channel.mention} as lockable channel!")
             
     @admin_and_up()
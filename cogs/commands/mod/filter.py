@@ -1,4 +1,5 @@
 import traceback
+from datetime import datetime, timedelta
 
 import discord
 from data.model.filterword import FilterWord
@@ -11,6 +12,8 @@ from utils.config import cfg
 from utils.context import ChromeyContext
 from utils.views.menu import Menu
 from utils.logger import logger
+from utils.mod.filter import flush_filter_hits
+from utils.mod.filter_engine import LITERAL, CompiledFilter, PatternError, pattern_source, validate_pattern
 from utils.permissions.checks import (PermissionsFailure, admin_and_up, always_whisper,
                                       mod_and_up)
 from utils.permissions.permissions import permissions
@@ -41,12 +44,33 @@ def format_filter_page(_, entries, current_page, all_pages):
         notify_flag = ""
         if word.notify:
             notify_flag = "🔔"
+        if word.kind != LITERAL:
+            notify_flag += f" `{word.kind}`"
         embed.add_field(name=word.word, value=f"Bypassed by: {permissions.level_info(word.bypass)}\nFlags: {notify_flag}")
     embed.set_footer(
         text=f"Page {current_page} of {len(all_pages)}")
     return embed
 
 
+def format_usage_page(hottest, description):
+    """Returns a page formatter for /filter usage, which shows the hottest entries
+    on every page and the dead entries paginated below them.
+    """
+
+    def formatter(_, entries, current_page, all_pages):
+        embed = discord.Embed(title="Filter usage", description=description, color=discord.Color.blurple())
+        if hottest:
+            embed.add_field(name="Hottest", value="\n".join(
+                f"`{discord.utils.escape_markdown(hit.word)}`: {hit.hits} hits, last {discord.utils.format_dt(hit.last_hit, style='R')}" for hit in hottest)[:1024], inline=False)
+
+        if entries:
+            embed.add_field(name="Dead", value="\n".join(f"`{discord.utils.escape_markdown(word.word)}`" for word in entries)[:1024], inline=False)
+        embed.set_footer(text=f"Page {current_page} of {len(all_pages)}")
+        return embed
+
+    return formatter
+
+
 class Filters(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
@@ -69,13 +93,13 @@ class Filters(commands.Cog):
 
         """
 
-        cur = user_service.get_user(ctx.author.id)
+        cur = await user_service.get_user(ctx.author.id)
         
         if should_ping is None:
             should_ping = not cur.offline_report_ping 
 
         cur.offline_report_ping = should_ping
-        cur.save()
+        await user_service.save_user(cur)
 
         if should_ping:
             await ctx.send_success("You will now be pinged for reports when offline")
@@ -86,12 +110,12 @@ class Filters(commands.Cog):
 
     @mod_and_up()
     @_filter.command(description="Add a word to filter")
-    async def add(self, ctx: ChromeyContext, notify: Option(bool, description="Whether to generate a report or not when this word is filtered"), bypass: Option(int, description="Level that bypasses this filter"), *, phrase: str) -> None:
+    async def add(self, ctx: ChromeyContext, notify: Option(bool, description="Whether to generate a report or not when this word is filtered"), bypass: Option(int, description="Level that bypasses this filter"), *, phrase: str, kind: Option(str, description="How to match the phrase", choices=["literal", "regex", "glob"], required=False) = LITERAL) -> None:
         """Adds a word to filter (admin only)
 
         Example usage
         -------------
-        /filter add notify:<shouldnotify> bypass:<bypasslevel> <phrase>
+        /filter add notify:<shouldnotify> bypass:<bypasslevel> <phrase> kind:<kind>
 
         Parameters
         ----------
@@ -101,20 +125,35 @@ class Filters(commands.Cog):
             "Level that can bypass this word"
         phrase : str
             "Phrase to filter"
+        kind : str
+            "literal (default), regex, or glob (`*` matches any characters but spaces, `?` one of them)"
         """
 
         fw = FilterWord()
         fw.bypass = bypass
         fw.notify = notify
         fw.word = phrase
+        fw.kind = kind
+
+        if kind != LITERAL:
+            try:
+                validate_pattern(pattern_source(phrase, kind))
+            except PatternError as e:
+                raise commands.BadArgument(str(e))
 
-        if not guild_service.add_filtered_word(fw):
+            # the patterns of the filter list are compiled together, make sure there's still room for this one
+            patterns = [word for word in guild_service.get_guild().filter_words if word.kind != LITERAL]
+            rejected = CompiledFilter(patterns + [fw]).rejected
+            if rejected and rejected[-1][0] is fw:
+                raise commands.BadArgument(rejected[-1][1])
+
+        if not await guild_service.add_filtered_word(fw):
             raise commands.BadArgument("That word is already filtered!")
 
         phrase = discord.utils.escape_markdown(phrase)
         phrase = discord.utils.escape_mentions(phrase)
 
-        await ctx.send_success(title="Added new word to filter!", description=f"This filter {'will' if notify else 'will not'} ping for reports, level {bypass} can bypass it, and the phrase is `{phrase}`")
+        await ctx.send_success(title="Added new word to filter!", description=f"This filter {'will' if notify else 'will not'} ping for reports, level {bypass} can bypass it, and the {kind if kind != LITERAL else 'phrase'} is `{phrase}`")
 
     @mod_and_up()
     @_filter.command(description="List filtered words", name="list")
@@ -136,6 +175,50 @@ class Filters(commands.Cog):
         menu = Menu(ctx, filters, per_page=12, page_formatter=format_filter_page, whisper=False)
         await menu.start()
 
+    @mod_and_up()
+    @_filter.command(description="Show which filtered words and raid phrases trigger, and which never do")
+    async def usage(self, ctx: ChromeyContext, filter_list: Option(str, description="List to look at", choices=["filter words", "raid phrases"], required=False) = "filter words", days: Option(int, description="Count entries without hits in this many days as dead", required=False) = 30):
+        """Shows the most triggered entries of a list, and the entries that haven't triggered in a while (mod only)
+
+        Example usage
+        -------------
+        /filter usage filter_list:<list> days:<days>
+
+        Parameters
+        ----------
+        filter_list : str
+            "filter words (default) or raid phrases"
+        days : int
+            "Entries without hits in this many days count as dead, 30 by default"
+        """
+
+        if days < 1:
+            raise commands.BadArgument("Days must be at least 1.")
+
+        field = "filter_words" if filter_list == "filter words" else "raid_phrases"
+        # include the hits that are still waiting to be written
+        await flush_filter_hits()
+        hits = await guild_service.get_filter_hits(field)
+
+        words = getattr(guild_service.get_guild(), field)
+        if len(words) == 0:
+            raise commands.BadArgument(f"There are no {filter_list}.")
+
+        recorded = [hits[word.word] for word in words if word.word in hits]
+        hottest = sorted(recorded, key=lambda hit: hit.hits, reverse=True)[:10]
+
+        cutoff = datetime.now() - timedelta(days=days)
+        dead = sorted((word for word in words if word.word not in hits or hits[word.word].last_hit < cutoff), key=lambda word: word.word.lower())
+
+        description = f"{len(dead)} of {len(words)} {filter_list} haven't triggered in the last {days} days."
+        formatter = format_usage_page(hottest, description)
+        if not dead:
+            await ctx.respond(embed=formatter(ctx, [], 1, [[]]))
+            return
+
+        menu = Menu(ctx, dead, per_page=20, page_formatter=formatter, whisper=False)
+        await menu.start()
+
     @mod_and_up()
     @_filter.command(description="Remove word from filter")
     async def remove(self, ctx: ChromeyContext, *, word: Option(str, autocomplete=filterwords_autocomplete)):
@@ -158,7 +241,7 @@ class Filters(commands.Cog):
         words = list(filter(lambda w: w.word.lower() == word.lower(), words))
         
         if len(words) > 0:
-            guild_service.remove_filtered_word(words[0].word)
+            await guild_service.remove_filtered_word(words[0].word)
             await ctx.send_success("Deleted!")
         else:
             await ctx.send_warning("That word is not filtered.", delete_after=5)            
@@ -184,7 +267,7 @@ class Filters(commands.Cog):
         except ValueError:
             raise commands.BadArgument("Invalid ID!")
 
-        if guild_service.add_whitelisted_guild(id):
+        if await guild_service.add_whitelisted_guild(id):
             await ctx.send_success("Whitelisted.")
         else:
             await ctx.send_warning("That server is already whitelisted.", delete_after=5)
@@ -210,7 +293,7 @@ class Filters(commands.Cog):
         except ValueError:
             raise commands.BadArgument("Invalid ID!")
 
-        if guild_service.remove_whitelisted_guild(id):
+        if await guild_service.remove_whitelisted_guild(id):
             await ctx.send_success("Blacklisted.")
         else:
             await ctx.send_warning("That server is already blacklisted.", delete_after=5)
@@ -231,7 +314,7 @@ class Filters(commands.Cog):
 
         """
 
-        if guild_service.add_ignored_channel(channel.id):
+        if await guild_service.add_ignored_channel(channel.id):
             await ctx.send_success(f"The filter will no longer run in {channel.mention}.")
         else:
             await ctx.send_warning("That channel is already ignored.", delete_after=5)
@@ -252,7 +335,7 @@ class Filters(commands.Cog):
             
         """
 
-        if guild_service.remove_ignored_channel(channel.id):
+        if await guild_service.remove_ignored_channel(channel.id):
             await ctx.send_success(f"Resumed filtering in {channel.mention}.")
         else:
             await ctx.send_warning("That channel is not already ignored.", delete_after=5)
@@ -280,7 +363,7 @@ class Filters(commands.Cog):
         
         if len(words) > 0:
             words[0].false_positive = not words[0].false_positive
-            if guild_service.update_filtered_word(words[0]):
+            if await guild_service.update_filtered_word(words[0]):
                 await ctx.send_success("Marked as potential false positive, we won't perform the enhanced checks on it!" if words[0].false_positive else "Removed as potential false positive.")
             else:
                 raise commands.BadArgument("Unexpected error occured trying to mark as false positive!")
@@ -93,7 +93,7 @@ class ModActions(commands.Cog):
 
         db_guild = guild_service.get_guild()
 
-        log = await add_kick_case(ctx, member, reason, db_guild)
+        log = await add_kick_case(ctx, member, reason)
         await notify_user(member, f"You were kicked from {ctx.guild.name}", log)
 
         await member.kick(reason=reason)
@@ -141,7 +141,6 @@ class ModActions(commands.Cog):
 
         db_guild = guild_service.get_guild()
         case = Case(
-            _id=db_guild.case_id,
             _type="MUTE",
             date=now,
             mod_id=ctx.author.id,
@@ -160,8 +159,8 @@ class ModActions(commands.Cog):
             raise commands.BadArgument(
                 "The database thinks this user is already muted.")
 
-        guild_service.inc_caseid()
-        user_service.add_case(member.id, case)
+        case._id = await guild_service.next_case_id()
+        await user_service.add_case(member.id, case)
 
         log = prepare_mute_log(ctx.author, member, case)
         await ctx.respond(embed=log)
@@ -205,14 +204,13 @@ class ModActions(commands.Cog):
             pass
 
         case = Case(
-            _id=db_guild.case_id,
             _type="UNMUTE",
             mod_id=ctx.author.id,
             mod_tag=str(ctx.author),
             reason=reason,
         )
-        guild_service.inc_caseid()
-        user_service.add_case(member.id, case)
+        case._id = await guild_service.next_case_id()
+        await user_service.add_case(member.id, case)
 
         log = prepare_unmute_log(ctx.author, member, case)
 
@@ -264,7 +262,7 @@ class ModActions(commands.Cog):
                     raise commands.BadArgument("That user is already banned!")
 
         self.bot.ban_cache.ban(user.id)
-        log = await add_ban_case(ctx, user, reason, db_guild)
+        log = await add_ban_case(ctx, user, reason)
 
         if not member_is_external:
             # if cfg.ban_appeal_url is None:
@@ -318,14 +316,13 @@ class ModActions(commands.Cog):
 
         db_guild = guild_service.get_guild()
         case = Case(
-            _id=db_guild.case_id,
             _type="UNBAN",
             mod_id=ctx.author.id,
             mod_tag=str(ctx.author),
             reason=reason,
         )
-        guild_service.inc_caseid()
-        user_service.add_case(user.id, case)
+        case._id = await guild_service.next_case_id()
+        await user_service.add_case(user.id, case)
 
         log = prepare_unban_log(ctx.author, user, case)
         await ctx.respond(embed=log)
@@ -382,7 +379,7 @@ class ModActions(commands.Cog):
         user = await mods_and_above_external_resolver(ctx, user)
 
         # retrieve user's case with given ID
-        cases = user_service.get_cases(user.id)
+        cases = await user_service.get_cases(user.id)
         case = cases.cases.filter(_id=case_id).first()
 
         reason = escape_markdown(reason)
@@ -405,7 +402,7 @@ class ModActions(commands.Cog):
         case.lifted_by_tag = str(ctx.author)
         case.lifted_by_id = ctx.author.id
         case.lifted_date = datetime.now()
-        cases.save()
+        await user_service.save_cases(cases)
 
         # prepare log embed, send to #public-mod-logs, user, channel where invoked
         log = prepare_liftwarn_log(ctx.author, user, case)
@@ -437,7 +434,7 @@ class ModActions(commands.Cog):
         user = await mods_and_above_external_resolver(ctx, user)
 
         # retrieve user's case with given ID
-        cases = user_service.get_cases(user.id)
+        cases = await user_service.get_cases(user.id)
         case = cases.cases.filter(_id=case_id).first()
 
         new_reason = escape_markdown(new_reason)
@@ -451,7 +448,7 @@ class ModActions(commands.Cog):
         old_reason = case.reason
         case.reason = new_reason
         case.date = datetime.now()
-        cases.save()
+        await user_service.save_cases(cases)
 
         log = prepare_editreason_log(ctx.author, user, case, old_reason)
 
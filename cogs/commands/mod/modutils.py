@@ -45,7 +45,7 @@ class ModUtils(commands.Cog):
                 raise commands.BadArgument(
                     f"Couldn't find user with ID {newmember}")
 
-        u, case_count = user_service.transfer_profile(oldmember.id, newmember.id)
+        u, case_count = await user_service.transfer_profile(oldmember.id, newmember.id)
 
         embed = discord.Embed(title="Transferred profile")
         embed.description = f"We transferred {oldmember.mention}'s profile to {newmember.mention}"
@@ -73,8 +73,7 @@ class ModUtils(commands.Cog):
         await logging_channel.send(embed=embed)
 
     async def prepare_rundown_embed(self, ctx: ChromeyContext, user):
-        user_info = user_service.get_user(user.id)
-        rd = user_service.rundown(user.id)
+        rd = await user_service.rundown(user.id)
         rd_text = ""
         for r in rd:
             rd_text += f"**{r._type}** - {r.punishment} - {r.reason} - {format_dt(r.date, style='R')}\n"
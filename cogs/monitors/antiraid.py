@@ -1,22 +1,19 @@
 import re
-import string
-from asyncio import Lock
 from datetime import datetime, timedelta, timezone
 
 import discord
-from data.model.case import Case
 from data.services.guild_service import guild_service
 from data.services.user_service import user_service
 from discord.ext import commands
-from expiringdict import ExpiringDict
-from fold_to_ascii import fold
 from utils.config import cfg
 from utils.context import ChromeyOldContext
-from utils.message_cooldown import MessageTextBucket
+from utils.mod.filter import find_triggered_raid_phrases
 from utils.mod.global_modactions import mute
-from utils.mod.mod_logs import prepare_ban_log
+from utils.mod.normalize import normalize_message
+from utils.mod.pipeline import ModerationContext
+from utils.mod.raid_ban import RaidBanExecutor
 from utils.mod.report import report_raid, report_raid_phrase, report_spam
-from utils.permissions.permissions import permissions
+from utils.sliding_window import SlidingWindow
 
 
 class RaidType:
@@ -30,33 +27,36 @@ class AntiRaidMonitor(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         
-        # cooldown to monitor if too many users join in a short period of time (more than 10 within 8 seconds)
-        self.join_raid_detection_threshold = commands.CooldownMapping.from_cooldown(rate=10, per=8, type=commands.BucketType.guild)
+        # the users that joined in the last 8 seconds, more than 10 of them is a raid and they're all banned
+        self.join_raid_detection_threshold = 10
+        self.recent_joins = SlidingWindow(8)
         # cooldown to monitor if users are spamming a message (8 within 6 seconds)
         self.message_spam_detection_threshold = commands.CooldownMapping.from_cooldown(rate=7, per=6.0, type=commands.BucketType.member)
-        # cooldown to monitor if too many accounts created on the same date are joining within a short period of time 
-        # (5 accounts created on the same date joining within 45 minutes of each other)
-        self.join_overtime_raid_detection_threshold = commands.CooldownMapping.from_cooldown(rate=4, per=2700, type=MessageTextBucket.custom)
-
-        # cooldown to monitor how many times AntiRaid has been triggered (5 triggers per 15 seconds puts server in lockdown)
-        self.raid_detection_threshold = commands.CooldownMapping.from_cooldown(rate=4, per=15.0, type=commands.BucketType.guild)
+        # the users created on the same date (the key) that joined in the last 45 minutes,
+        # more than 4 of them are banned
+        self.join_overtime_raid_detection_threshold = 4
+        self.join_overtime_windows = {}
+
+        # the users that triggered AntiRaid in the last 15 seconds, more than 4 triggers
+        # puts the server in lockdown and bans all of them
+        self.raid_detection_threshold = 4
+        self.raid_detections = SlidingWindow(15)
         # cooldown to only send one raid alert for moderators per 10 minutes
         self.raid_alert_cooldown = commands.CooldownMapping.from_cooldown(1, 600.0, commands.BucketType.guild)
         # cooldown to only send one report per spamming member
         self.spam_report_cooldown = commands.CooldownMapping.from_cooldown(rate=1, per=10.0, type=commands.BucketType.member)
-        
-        # stores the users that trigger self.join_raid_detection_threshold so we can ban them
-        self.join_user_mapping = ExpiringDict(max_len=100, max_age_seconds=10)
-        # stores the users that trigger self.message_spam_detection_threshold so we can ban them
-        self.spam_user_mapping = ExpiringDict(max_len=100, max_age_seconds=10)
-        # stores the users that trigger self.join_overtime_raid_detection_threshold so we can ban them
-        self.join_overtime_mapping = ExpiringDict(max_len=100, max_age_seconds=2700)
-        # stores the users that we have banned so we don't try to ban them repeatedly
-        self.ban_user_mapping = ExpiringDict(max_len=100, max_age_seconds=120)
-        
-        # locks to prevent race conditions when banning concurrently
-        self.join_overtime_lock = Lock()
-        self.banning_lock = Lock()
+
+        # bans raid accounts a few at a time, in the background
+        self.ban_executor = RaidBanExecutor(bot)
+
+        # message spam and scam links only apply to whitenames
+        bot.moderation.add_stage("ping_spam", "antiraid", self.raid_stage(self.ping_spam, RaidType.PingSpam), bypass=2)
+        bot.moderation.add_stage("raid_phrases", "antiraid", self.raid_stage(self.raid_phrase_detected, RaidType.RaidPhrase), bypass=2)
+        bot.moderation.add_stage("message_spam", "antiraid", self.raid_stage(self.message_spam, RaidType.MessageSpam), bypass=1)
+        bot.moderation.add_stage("scam_links", "antiraid", self.scam_link_stage, bypass=1)
+
+    def cog_unload(self):
+        self.ban_executor.stop()
 
     @commands.Cog.listener()
     async def on_member_join(self, member):
@@ -77,25 +77,16 @@ class AntiRaidMonitor(commands.Cog):
         
         
         """Detect whether more than 10 users join within 8 seconds"""
-        # add user to cooldown
         current = datetime.now().timestamp()
-        join_spam_detection_bucket = self.join_raid_detection_threshold.get_bucket(member)
-        self.join_user_mapping[member.id] = member
-        
-        # if ratelimit is triggered, we should ban all the users that joined in the past 8 seconds
-        if join_spam_detection_bucket.update_rate_limit(current):
-            users = list(self.join_user_mapping.keys())
-            for user in users:
-                try:
-                    user = self.join_user_mapping[user]
-                except KeyError:
-                    continue
-                
-                try:
-                    await self.raid_ban(user, reason="Join spam detected.")
-                except Exception:
-                    pass
-                
+
+        # if there are too many, we should ban all the users that joined in the past 8 seconds
+        before = self.recent_joins.expire(current)
+        if self.recent_joins.add(member.id, current, member) > self.join_raid_detection_threshold:
+            # the others were submitted when the threshold was crossed
+            joined = self.recent_joins.items() if before <= self.join_raid_detection_threshold else [(member.id, member)]
+            for _, user in joined:
+                self.ban_executor.submit(user, reason="Join spam detected.")
+
             raid_alert_bucket = self.raid_alert_cooldown.get_bucket(member)
             if not raid_alert_bucket.update_rate_limit(current):
                 await report_raid(member)
@@ -110,7 +101,7 @@ class AntiRaidMonitor(commands.Cog):
 
         # skip user if we manually verified them, i.e they were approved by a moderator
         # using the !verify command when they appealed a ban.
-        if user_service.get_user(member.id).raid_verified:
+        if (await user_service.get_user(member.id)).raid_verified:
             return
 
         # skip if it's an older account (before May 1st 2021)
@@ -135,48 +126,43 @@ class AntiRaidMonitor(commands.Cog):
         timestamp = member.created_at.strftime(
             "%B %d, %Y")
         
-        # store this user with all the users that were created on this date
-        async with self.join_overtime_lock:
-            if self.join_overtime_mapping.get(timestamp) is None:
-                self.join_overtime_mapping[timestamp] = [member]
-            else:
-                if member in self.join_overtime_mapping[timestamp]:
-                    return
-                
-                self.join_overtime_mapping[timestamp].append(member)
-
-        # handle ratelimitting. If ratelimit is triggered, ban all the users we know were created on this date.
-        bucket = self.join_overtime_raid_detection_threshold.get_bucket(timestamp)
         current = member.joined_at.replace(tzinfo=timezone.utc).timestamp()
-        if bucket.update_rate_limit(current):
-            users = [ m for m in self.join_overtime_mapping.get(timestamp) ]
-            for user in users:
-                try:
-                    await self.raid_ban(user, reason=f"Join spam over time detected (bucket `{timestamp_bucket_for_logging}`)", dm_user=True)
-                    self.join_overtime_mapping[timestamp].remove(user)
-                except Exception:
-                    pass
+        # forget the dates nobody joined with in the last 45 minutes
+        for date, window in list(self.join_overtime_windows.items()):
+            if not window.expire(current):
+                del self.join_overtime_windows[date]
 
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message):
-        if message.guild is None:
-            return
-        if message.author.bot:
-            return
-        if message.guild.id != cfg.guild_id:
-            return
-        message.author = message.guild.get_member(message.author.id)
-        if permissions.has(message.guild, message.author, 2):
+        # store this user with all the users that were created on this date
+        window = self.join_overtime_windows.get(timestamp)
+        if window is None:
+            window = self.join_overtime_windows[timestamp] = SlidingWindow(2700)
+        elif member.id in window:
             return
-        
-        if await self.ping_spam(message):  
-            await self.handle_raid_detection(message, RaidType.PingSpam)
-        elif await self.raid_phrase_detected(message):
-            await self.handle_raid_detection(message, RaidType.RaidPhrase)
-        elif await self.message_spam(message):
-            await self.handle_raid_detection(message, RaidType.MessageSpam)
-        elif await self.detect_scam_link(message):
-            await self.report_possible_raid_phrase(message)
+
+        # if there are too many, ban all the users we know were created on this date.
+        before = len(window)
+        if window.add(member.id, current, member) > self.join_overtime_raid_detection_threshold:
+            joined = window.items() if before <= self.join_overtime_raid_detection_threshold else [(member.id, member)]
+            for _, user in joined:
+                self.ban_executor.submit(user, reason=f"Join spam over time detected (bucket `{timestamp_bucket_for_logging}`)", dm_user=True)
+
+    def raid_stage(self, detect, raid_type: RaidType):
+        """Pipeline stage that runs a raid detection check, and handles the raid if it triggers"""
+
+        async def stage(ctx: ModerationContext) -> bool:
+            if not await detect(ctx.message):
+                return False
+
+            await self.handle_raid_detection(ctx.message, raid_type)
+            return True
+        return stage
+
+    async def scam_link_stage(self, ctx: ModerationContext) -> bool:
+        if not await self.detect_scam_link(ctx.message):
+            return False
+
+        await self.report_possible_raid_phrase(ctx.message)
+        return True
 
     async def detect_scam_link(self, message: discord.Message):
         # check if message contains @everyone or @here
@@ -189,10 +175,6 @@ class AntiRaidMonitor(commands.Cog):
         if url is None:
             return False
 
-        # don't trigger if this user isn't a whitename
-        if permissions.has(message.guild, message.author, 1):
-            return False
-        
         # don't spam this
         bucket = self.spam_report_cooldown.get_bucket(message)
         current = message.created_at.replace(tzinfo=timezone.utc).timestamp()
@@ -203,15 +185,13 @@ class AntiRaidMonitor(commands.Cog):
 
     async def handle_raid_detection(self, message: discord.Message, raid_type: RaidType):
         current = message.created_at.replace(tzinfo=timezone.utc).timestamp()
-        spam_detection_bucket = self.raid_detection_threshold.get_bucket(message)
         user = message.author
         
         do_freeze = False
         do_banning = False
-        self.spam_user_mapping[user.id] = 1
         
-        # has the antiraid filter been triggered 5 or more times in the past 10 seconds?
-        if spam_detection_bucket.update_rate_limit(current):
+        # has the antiraid filter been triggered 5 or more times in the past 15 seconds?
+        if self.raid_detections.add(user.id, current, user) > self.raid_detection_threshold:
             do_banning = True
             # yes! notify the mods and lock the server.
             raid_alert_bucket = self.raid_alert_cooldown.get_bucket(message)
@@ -233,21 +213,12 @@ class AntiRaidMonitor(commands.Cog):
                     title = "Message spam detected"
                 await report_spam(self.bot, message, user, title=title)
             else:
-                users = list(self.spam_user_mapping.keys())
-                for user in users:
-                    try:
-                        _ = self.spam_user_mapping[user]
-                    except KeyError:
-                        continue
-                                        
-                    user = message.guild.get_member(user)
+                for user_id in self.raid_detections.keys():
+                    user = message.guild.get_member(user_id)
                     if user is None:
                         continue
-                    
-                    try:
-                        await self.raid_ban(user, reason="Ping spam detected" if raid_type is RaidType.PingSpam else "Message spam detected")
-                    except Exception:
-                        pass
+
+                    self.ban_executor.submit(user, reason="Ping spam detected" if raid_type is RaidType.PingSpam else "Message spam detected")
 
     async def ping_spam(self, message):
         """If a user pings more than 5 people, or pings more than 2 roles, mute them.
@@ -272,9 +243,6 @@ class AntiRaidMonitor(commands.Cog):
         A mod must either unmute or ban the user.
         """
 
-        if permissions.has(message.guild, message.author, 1):
-            return False
-                
         bucket = self.message_spam_detection_threshold.get_bucket(message)
         current = message.created_at.replace(tzinfo=timezone.utc).timestamp()
 
@@ -296,31 +264,10 @@ class AntiRaidMonitor(commands.Cog):
         will immediately be banned. Uses the same system as filters to search messages for the phrases.
         """
         
-        if permissions.has(message.guild, message.author, 2):
-            return False
-
-        #TODO: Unify filtering system
-        symbols = (u"абвгдеёжзийклмнопрстуфхцчшщъыьэюяАБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯ",
-                u"abBrdeex3nnKnmHonpcTyoxu4wwbbbeoRABBrDEEX3NNKNMHONPCTyOXU4WWbbbEOR")
-
-        tr = {ord(a): ord(b) for a, b in zip(*symbols)}
-
-        folded_message = fold(message.content.translate(tr).lower()).lower()
-        folded_without_spaces = "".join(folded_message.split())
-        folded_without_spaces_and_punctuation = folded_without_spaces.translate(str.maketrans('', '', string.punctuation))
-
-        if folded_message:
-            for word in guild_service.get_guild().raid_phrases:
-                if not permissions.has(message.guild, message.author, word.bypass):
-                    if (word.word.lower() in folded_message) or \
-                        (not word.false_positive and word.word.lower() in folded_without_spaces) or \
-                        (not word.false_positive and word.word.lower() in folded_without_spaces_and_punctuation):
-                        # remove all whitespace, punctuation in message and run filter again
-                        if word.false_positive and word.word.lower() not in folded_message.split():
-                            continue
-
-                        await self.raid_ban(message.author, dm_user=True)
-                        return True
+        if await find_triggered_raid_phrases(normalize_message(message), message.author):
+            # banned in the background, the stage doesn't wait for the bans queued before this one
+            self.ban_executor.submit(message.author, dm_user=True)
+            return True
         return False
 
     async def report_possible_raid_phrase(self, message):
@@ -343,56 +290,6 @@ class AntiRaidMonitor(commands.Cog):
         # report the user to mods
         await report_raid_phrase(self.bot, message, domain)
             
-    async def raid_ban(self, user: discord.Member, reason="Raid phrase detected", dm_user=False):
-        """Helper function to ban users"""
-        
-        async with self.banning_lock:
-            # if self.ban_user_mapping.get(user.id) is not None:
-            if self.bot.ban_cache.is_banned(user.id):
-                return
-            else:
-                self.bot.ban_cache.ban(user.id)
-            
-            db_guild = guild_service.get_guild()
-            
-            case = Case(
-                _id=db_guild.case_id,
-                _type="BAN",
-                date=datetime.now(),
-                mod_id=self.bot.user.id,
-                mod_tag=str(self.bot.user),
-                punishment="PERMANENT",
-                reason=reason
-            )
-
-            guild_service.inc_caseid()
-            user_service.add_case(user.id, case)
-            
-            log = prepare_ban_log(self.bot.user, user, case)
-            
-            if dm_user:
-                try:
-                    if reason == "Raid phrase detected":
-                        await user.send("We detected that your account was hacked as it posted a scam text in our server. We have banned and unbanned you to delete all of your scam messages. Please secure your account, then you can rejon using https://discord.gg/chromeos.", embed=log)
-                    else:
-                        await user.send(f"You were banned from {user.guild.name}.\n\nThis action was performed automatically. If you think this was a mistake, please send a message here: https://www.reddit.com/message/compose?to=%2Fr%2chromeos", embed=log)
-                except Exception:
-                    pass
-            
-            if user.guild.get_member(user.id) is not None:
-                await user.ban(reason="Raid")
-            else:
-                await user.guild.ban(discord.Object(id=user.id), reason="Raid")
-            
-            if reason == "Raid phrase detected":
-                await user.guild.unban(discord.Object(id=user.id), reason="Raid")
-                
-            public_logs = user.guild.get_channel(db_guild.channel_modlogs)
-            if public_logs:
-                log.remove_author()
-                log.set_thumbnail(url=user.display_avatar)
-                await public_logs.send(embed=log)
-
     async def freeze_server(self, guild):
         """Freeze all channels marked as freezeable during a raid, meaning only people with the Member+ role and up
         can talk (temporarily lock out whitenames during a raid)"""
@@ -1,14 +1,18 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 
+import hashlib
 import re
 from datetime import timezone
 from data.services.guild_service import guild_service
-from utils.config import cfg
-from utils.mod.filter import find_triggered_filters
+from utils.cache import LRUCache
+from utils.logger import logger
+from utils.misc import InviteCache
+from utils.mod.filter import compiled_filter, find_triggered_filters, flush_filter_hits
 from utils.mod.global_modactions import mute
+from utils.mod.normalize import normalize_message
+from utils.mod.pipeline import ModerationContext
 from utils.mod.report import report
-from utils.permissions.permissions import permissions
 
 class Filter(commands.Cog):
     def __init__(self, bot):
@@ -17,43 +21,53 @@ class Filter(commands.Cog):
         self.spoiler_filter = r'\|\|(.*?)\|\|'
         self.spam_cooldown = commands.CooldownMapping.from_cooldown(
             2, 10.0, commands.BucketType.member)
+        self.invite_cache = InviteCache(bot)
+        # member ID -> (filter version, digest of the display name last run through the filter)
+        self.checked_names = LRUCache(maxsize=100000, ttl=86400)
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        await self.run_filter(message)
+        bot.moderation.add_stage("bad_words", "filter", self.bad_word_stage, bypass=3)
+        bot.moderation.add_stage("invites", "filter", self.invite_stage, bypass=2)
+        self.flush_hits.start()
 
-    @commands.Cog.listener()
-    async def on_message_edit(self, _, message):
-        await self.run_filter(message)
+    def cog_unload(self):
+        self.flush_hits.cancel()
+
+    @tasks.loop(seconds=60)
+    async def flush_hits(self):
+        """Write the hit counts of filter words and raid phrases to the database"""
+        try:
+            await flush_filter_hits()
+        except Exception as e:
+            # the hits are kept and written with the next flush
+            logger.error(f"Couldn't write filter hits: {e}")
+
+    @flush_hits.after_loop
+    async def after_flush_hits(self):
+        # also runs when the cog is unloaded, so the last minute of hits isn't lost
+        await self.flush_hits()
 
     @commands.Cog.listener()
-    async def on_member_update(self, _, member: discord.Member):
+    async def on_member_update(self, before: discord.Member, member: discord.Member):
+        # role changes, timeouts, boosts, avatars etc. don't change what the nick filter sees
+        if before.display_name == member.display_name:
+            return
+
         await self.nick_filter(member)
 
-    async def run_filter(self, message: discord.Message):
-        if not message.guild:
-            return
-        if message.guild.id != cfg.guild_id:
-            return
-        if message.author.bot:
-            return
-        if permissions.has(message.guild, message.author, 3):
-            return
-        db_guild = guild_service.get_guild()
+    async def bad_word_stage(self, ctx: ModerationContext) -> bool:
+        return bool(ctx.message.content) and await self.bad_word_filter(ctx.message, ctx.db_guild, ctx.level)
 
-        # run through filters
-        if message.content and await self.bad_word_filter(message, db_guild):
-            return
+    async def invite_stage(self, ctx: ModerationContext) -> bool:
+        return bool(ctx.message.content) and await self.do_invite_filter(ctx.message, ctx.db_guild)
 
-        if permissions.has(message.guild, message.author, 2):
-            return
-        if message.content and await self.do_invite_filter(message, db_guild):
+    async def nick_filter(self, member):
+        # skip names we already checked against the current filter list
+        checked = (compiled_filter().version, hashlib.blake2b(member.display_name.encode(), digest_size=8).digest())
+        if self.checked_names.get(member.id) == checked:
             return
-        # if await self.do_spoiler_newline_filter(message, db_guild):
-        #     return
+        self.checked_names.set(member.id, checked)
 
-    async def nick_filter(self, member):
-        triggered_words = find_triggered_filters(
+        triggered_words = await find_triggered_filters(
             member.display_name, member)
         
         if not triggered_words:
@@ -67,9 +81,9 @@ class Filter(commands.Cog):
         except Exception:
             pass
 
-    async def bad_word_filter(self, message, db_guild) -> bool:
-        triggered_words = find_triggered_filters(
-            message.content, message.author)
+    async def bad_word_filter(self, message, db_guild, level=None) -> bool:
+        triggered_words = await find_triggered_filters(
+            message.content, message.author, normalize_message(message), level)
         if not triggered_words:
             return
 
@@ -99,25 +113,8 @@ class Filter(commands.Cog):
 
         whitelist = db_guild.filter_excluded_guilds
         for invite in invites:
-            try:
-                invite = await self.bot.fetch_invite(invite)
-
-                id = None
-                if isinstance(invite, discord.Invite):
-                    if invite.guild is not None:
-                        id = invite.guild.id
-                    else:
-                        id = 123
-                elif isinstance(invite, discord.PartialInviteGuild) or isinstance(invite, discord.PartialInviteChannel):
-                    id = invite.id
-
-                if id not in whitelist:
-                    await self.delete(message)
-                    await self.ratelimit(message)
-                    await report(self.bot, message, invite, invite=invite)
-                    return True
-
-            except discord.NotFound:
+            # None if the invite doesn't exist, which is reported as well
+            if await self.invite_cache.resolve(invite) not in whitelist:
                 await self.delete(message)
                 await self.ratelimit(message)
                 await report(self.bot, message, invite, invite=invite)
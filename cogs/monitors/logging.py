@@ -29,7 +29,7 @@ class Logging(commands.Cog):
         if member.guild.id != cfg.guild_id:
             return
 
-        db_user = user_service.get_user(member.id)
+        db_user = await user_service.get_user(member.id)
         db_guild = guild_service.get_guild()
         channel = member.guild.get_channel(db_guild.channel_private)
 
@@ -104,8 +104,7 @@ class Logging(commands.Cog):
                 return
 
             webhook = (await channel.create_webhook(name=f"Webhook {channel.name}")).url
-            db_guild.emoji_logging_webhook = webhook
-            db_guild.save()
+            await guild_service.set_emoji_logging_webhook(webhook)
 
 
         content = f"Reacted the {reaction.emoji} emote\n\n{reaction.message.channel.mention} | [Link to message]({reaction.message.jump_url}) | **{member.id}**"
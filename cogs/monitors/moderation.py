@@ -0,0 +1,24 @@
+import discord
+from discord.ext import commands
+
+
+class Moderation(commands.Cog):
+    """Feeds messages into the moderation pipeline (bot.moderation). The checks themselves
+    are registered as stages by the Filter and AntiRaidMonitor cogs.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message):
+        await self.bot.moderation.run(message)
+
+    @commands.Cog.listener()
+    async def on_message_edit(self, _, message: discord.Message):
+        # edits only go through the word and invite filters, like before
+        await self.bot.moderation.run(message, chains=("filter",))
+
+
+def setup(bot):
+    bot.add_cog(Moderation(bot))
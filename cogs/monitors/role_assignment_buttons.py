@@ -111,7 +111,7 @@ class RoleAssignButtons(commands.Cog):
         if not reaction_mapping[message.id].keys():
             raise commands.BadArgument("Nothing to do.")
 
-        guild_service.add_rero_mapping(reaction_mapping)
+        await guild_service.add_rero_mapping(reaction_mapping)
 
         view = discord.ui.View(timeout=None)
         resulting_reactions_list = ""
@@ -191,7 +191,7 @@ class RoleAssignButtons(commands.Cog):
             reaction_mapping[str(reaction.emoji)] = role.id
             break
 
-        guild_service.append_rero_mapping(message_id, reaction_mapping)
+        await guild_service.append_rero_mapping(message_id, reaction_mapping)
 
         view = discord.ui.View(timeout=None)
         resulting_reactions_list = ""
@@ -277,8 +277,8 @@ class RoleAssignButtons(commands.Cog):
 
         rero_mapping = {after: rero_mapping}
 
-        guild_service.add_rero_mapping(rero_mapping)
-        guild_service.delete_rero_mapping(before)
+        await guild_service.add_rero_mapping(rero_mapping)
+        await guild_service.delete_rero_mapping(before)
 
         await before_message.edit(view=None)
 
@@ -1,6 +1,34 @@
 import mongoengine
 import datetime
 
+# reasons used by the antiraid system, mapped to the category they are counted under in /raidstats.
+# order matters, the first phrase contained in a reason wins.
+RAID_REASON_CATEGORIES = {
+    "Join spam detected": "Join spam",
+    "Join spam over time detected": "Join spam over time",
+    "Raid phrase detected": "Raid phrase",
+    "Ping spam": "Ping spam",
+    "Message spam": "Message spam",
+}
+
+
+def normalize_reason(reason: str) -> str:
+    """Lowercase a case reason and strip everything but letters, digits and spaces,
+    so that reasons which only differ in punctuation are counted together in /casestats.
+    """
+
+    return ''.join(e for e in reason.lower() if e.isalnum() or e == " ").strip()
+
+
+def reason_category(reason: str):
+    """Return the antiraid category of a case reason, or None if it wasn't an antiraid case."""
+
+    for phrase, category in RAID_REASON_CATEGORIES.items():
+        if phrase in reason:
+            return category
+    return None
+
+
 class Case(mongoengine.EmbeddedDocument):
     _id               = mongoengine.IntField(required=True)
     _type             = mongoengine.StringField(required=True)
@@ -14,4 +42,12 @@ class Case(mongoengine.EmbeddedDocument):
     lifted_by_tag     = mongoengine.StringField()
     lifted_by_id      = mongoengine.IntField()
     lifted_reason     = mongoengine.StringField()
-    lifted_date       = mongoengine.DateField()
\ No newline at end of file
+    lifted_date       = mongoengine.DateField()
+    normalized_reason = mongoengine.StringField()
+    reason_category   = mongoengine.StringField()
+
+    def clean(self):
+        # precompute the fields that case statistics are aggregated on
+        if self.reason is not None:
+            self.normalized_reason = normalize_reason(self.reason)
+            self.reason_category = reason_category(self.reason)
\ No newline at end of file
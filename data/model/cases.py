@@ -6,5 +6,9 @@ class Cases(mongoengine.Document):
     cases = mongoengine.EmbeddedDocumentListField(Case, default=[])
     meta = {
         'db_alias': 'default',
-        'collection': 'cases'
+        'collection': 'cases',
+        'indexes': [
+            'cases.mod_id',
+            'cases.reason_category'
+        ]
     }
\ No newline at end of file
@@ -0,0 +1,15 @@
+import mongoengine
+
+class FilterHit(mongoengine.Document):
+    filter_list = mongoengine.StringField(required=True)
+    word        = mongoengine.StringField(required=True)
+    hits        = mongoengine.IntField(default=0)
+    last_hit    = mongoengine.DateTimeField()
+
+    meta = {
+        'db_alias': 'default',
+        'collection': 'filter_hits',
+        'indexes': [
+            {'fields': ['filter_list', 'word'], 'unique': True}
+        ]
+    }
@@ -5,3 +5,4 @@ class FilterWord(mongoengine.EmbeddedDocument):
     bypass               = mongoengine.IntField(required=True)
     word                 = mongoengine.StringField(required=True)
     false_positive       = mongoengine.BooleanField(default=False)
+    kind                 = mongoengine.StringField(default="literal", choices=["literal", "regex", "glob"])
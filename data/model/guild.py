@@ -1,6 +1,5 @@
 import mongoengine
 from data.model.filterword import FilterWord
-from data.model.tag import Tag
 
 class Guild(mongoengine.Document):
     _id                       = mongoengine.IntField(required=True)
@@ -30,11 +29,13 @@ class Guild(mongoengine.Document):
     raid_phrases              = mongoengine.EmbeddedDocumentListField(FilterWord, default=[])
     logging_excluded_channels = mongoengine.ListField(default=[])
     locked_channels           = mongoengine.ListField(default=[])
-    tags                      = mongoengine.EmbeddedDocumentListField(Tag, default=[])
     ban_today_spam_accounts   = mongoengine.BooleanField(default=False)
+    config_version            = mongoengine.IntField(default=0)
 
     meta = {
         'db_alias': 'default',
-        'collection': 'guilds'
+        'collection': 'guilds',
+        # leftover fields (e.g. tags from before they got their own collection) are ignored
+        'strict': False
     }
 
@@ -0,0 +1,18 @@
+import mongoengine
+from datetime import datetime
+
+class KarmaEvent(mongoengine.Document):
+    from_id = mongoengine.IntField(required=True)
+    to_id   = mongoengine.IntField(required=True)
+    amount  = mongoengine.IntField(required=True)
+    reason  = mongoengine.StringField()
+    date    = mongoengine.DateTimeField(default=datetime.now, required=True)
+
+    meta = {
+        'db_alias': 'default',
+        'collection': 'karma_events',
+        'indexes': [
+            ('to_id', '-date'),
+            ('from_id', '-date')
+        ]
+    }
\ No newline at end of file
@@ -1,7 +1,7 @@
 import mongoengine
 from datetime import datetime
 
-class Tag(mongoengine.EmbeddedDocument):
+class Tag(mongoengine.Document):
     _id         = mongoengine.IntField(required=True)
     name         = mongoengine.StringField(required=True)
     content      = mongoengine.StringField(required=True)
@@ -10,4 +10,12 @@ class Tag(mongoengine.EmbeddedDocument):
     added_date   = mongoengine.DateTimeField(default=datetime.now)
     use_count    = mongoengine.IntField(default=0)
     image        = mongoengine.FileField(default=None)
-    args         = mongoengine.BooleanField(default=False, required=True)
\ No newline at end of file
+    args         = mongoengine.BooleanField(default=False, required=True)
+
+    meta = {
+        'db_alias': 'default',
+        'collection': 'tags',
+        'indexes': [
+            {'fields': ['name', 'args'], 'unique': True}
+        ]
+    }
\ No newline at end of file
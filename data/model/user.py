@@ -7,11 +7,14 @@ class User(mongoengine.Document):
     raid_verified       = mongoengine.BooleanField(default=False, required=True)
     sticky_roles        = mongoengine.ListField(default=[])
 
-    karma                  = mongoengine.IntField(required=True, default=0)
-    karma_received_history = mongoengine.ListField(default=[])
-    karma_given_history    = mongoengine.ListField(default=[])
-    
+    karma               = mongoengine.IntField(required=True, default=0)
+
     meta = {
         'db_alias': 'default',
-        'collection': 'users'
+        'collection': 'users',
+        # leftover fields (e.g. karma history from before the karma_events ledger) are ignored
+        'strict': False,
+        'indexes': [
+            ('-karma', '-_id')
+        ]
     }
\ No newline at end of file
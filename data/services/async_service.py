@@ -0,0 +1,54 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
+
+# mongoengine and pymongo are blocking but thread safe, so database calls are
+# handed off to this pool instead of stalling the event loop (and with it the gateway heartbeat)
+executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="database")
+
+
+async def run_in_executor(func, *args, **kwargs):
+    """Run a blocking function on the database thread pool and wait for its result.
+
+    Parameters
+    ----------
+    func : Callable
+        The blocking function to run
+    *args, **kwargs
+        Arguments passed to `func`
+
+    Returns
+    -------
+    Any
+        Whatever `func` returned.
+    """
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, partial(func, *args, **kwargs))
+
+
+class AsyncService:
+    """Asynchronous facade over one of the synchronous services.
+
+    It exposes the same methods as the service it wraps, except that they are coroutines
+    which run on the database thread pool. Methods listed in `passthrough` only read
+    in-memory state, so they are returned as-is and can be called without awaiting.
+
+    Scripts and other code that is not running inside the event loop can keep using the
+    blocking API through the `sync` attribute.
+    """
+
+    def __init__(self, service, passthrough=()):
+        self.sync = service
+        self.passthrough = set(passthrough)
+
+    def __getattr__(self, name):
+        attr = getattr(self.sync, name)
+        if name in self.passthrough or not callable(attr):
+            return attr
+
+        @wraps(attr)
+        async def method(*args, **kwargs):
+            return await run_in_executor(attr, *args, **kwargs)
+
+        return method
@@ -1,12 +1,32 @@
+import threading
+from datetime import datetime
+
+from data.model.filter_hit import FilterHit
 from data.model.filterword import FilterWord
 from data.model.guild import Guild
 from data.model.tag import Tag
+from data.services.async_service import AsyncService
+from pymongo import ReturnDocument, UpdateOne
 from utils.config import cfg
 
 
 class GuildService:
+    def __init__(self):
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self.version = 0
+
+        self._case_id_lock = threading.Lock()
+        self._next_case_id = None
+        self._case_id_block_end = None
+
     def get_guild(self) -> Guild:
-        """Returns the state of the main guild from the database.
+        """Returns the state of the main guild. This is served from an in-memory
+        snapshot which is loaded once and then replaced whenever the Guild document
+        is written to through this service, so reading it costs no database round-trip.
+
+        The snapshot is shared by every caller and must be treated as read-only;
+        changes have to go through one of the methods of this service.
 
         Returns
         -------
@@ -14,55 +34,180 @@ class GuildService:
             The Guild document object that holds information about the main guild.
         """
 
-        return Guild.objects(_id=cfg.guild_id).first()
-    
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = self.refresh()
+        return snapshot
+
+    def refresh(self) -> Guild:
+        """Reload the Guild snapshot from the database and bump `version`.
+        The new snapshot is swapped in as a whole, so concurrent readers either
+        see the old or the new document, never a partially updated one.
+
+        Returns
+        -------
+        Guild
+            The freshly loaded Guild document.
+        """
+
+        return self.replace_snapshot(Guild.objects(_id=cfg.guild_id).first())
+
+    def replace_snapshot(self, snapshot: Guild) -> Guild:
+        """Swap in a Guild document that was loaded elsewhere, for example from a
+        change stream event. Snapshots older than the current one (by `config_version`)
+        are ignored, so out-of-order updates can't roll the configuration back.
+
+        Parameters
+        ----------
+        snapshot : Guild
+            The new state of the main guild.
+
+        Returns
+        -------
+        Guild
+            The snapshot that is current after this call.
+        """
+
+        with self._lock:
+            current = self._snapshot
+            if current is not None and snapshot.config_version < current.config_version:
+                return current
+
+            self._snapshot = snapshot
+            self.version += 1
+        return snapshot
+
+    def _modify(self, filters: dict = None, **update) -> Guild:
+        """Apply an update to the Guild document and swap in the updated document as the
+        snapshot. Guild.config_version is incremented by the same update, so other
+        processes can notice the change.
+
+        Parameters
+        ----------
+        filters : dict
+            Extra conditions the document has to match, e.g. for positional updates.
+        **update
+            The update, in mongoengine's `modify` syntax.
+
+        Returns
+        -------
+        Guild
+            The updated document, or None if `filters` didn't match and nothing was written.
+        """
+
+        guild = Guild.objects(_id=cfg.guild_id, **(filters or {})).modify(new=True, inc__config_version=1, **update)
+        if guild is not None:
+            self.replace_snapshot(guild)
+        return guild
+
     def add_tag(self, tag: Tag) -> None:
-        Guild.objects(_id=cfg.guild_id).update_one(push__tags=tag)
+        tag.save()
 
     def remove_tag(self, _id: int):
-        return Guild.objects(_id=cfg.guild_id).update_one(pull__tags___id=Tag(_id=_id)._id)
+        return Tag.objects(_id=_id).delete()
 
     def get_tag_by_name(self, name: str, args: bool):
-        g = Guild.objects(_id=cfg.guild_id).first()
-        for t in g.tags:
-            if t.name  == name and t.args == args:
-                t.use_count += 1
-                g.save()
-                return t
-        return None
+        """Look up a tag by its name and whether it takes arguments, and count this as a use.
+
+        Parameters
+        ----------
+        name : str
+            Name of the tag
+        args : bool
+            Whether we want the variant of the tag that supports arguments
+
+        Returns
+        -------
+        Tag
+            The tag, or None if it doesn't exist.
+        """
+
+        return Tag.objects(name=name, args=args).modify(inc__use_count=1, new=True)
 
     def get_tag(self, _id: int):
-        g = Guild.objects(_id=cfg.guild_id).first()
-        for t in g.tags:
-            if t._id == _id:
-                t.use_count += 1
-                g.save()
-                return t
-        return None
+        return Tag.objects(_id=_id).modify(inc__use_count=1, new=True)
+
+    def all_tags(self):
+        return list(Tag.objects.order_by('name'))
+
+    def get_tag_names(self, prefix: str = "", limit: int = 25):
+        """Return the distinct names of tags starting with `prefix`, in alphabetical order.
+        Tag names are stored in lowercase, so the prefix should be lowercase too.
+        """
+
+        tags = Tag.objects(name__startswith=prefix).only('name').order_by('name')
+        names = []
+        for tag in tags:
+            if tag.name not in names:
+                names.append(tag.name)
+                if len(names) == limit:
+                    break
+        return names
 
     def add_meme(self, meme: Tag) -> None:
-        Guild.objects(_id=cfg.guild_id).update_one(push__memes=meme)
+        self._modify(push__memes=meme)
 
     def remove_meme(self, meme: str):
-        return Guild.objects(_id=cfg.guild_id).update_one(pull__memes__name=Tag(name=meme).name)
+        return self._modify(pull__memes__name=Tag(name=meme).name) is not None
 
     def edit_meme(self, meme):
-        return Guild.objects(_id=cfg.guild_id, memes__name=meme.name).update_one(set__memes__S=meme)
+        return self._modify({"memes__name": meme.name}, set__memes__S=meme) is not None
 
     def get_meme(self, name: str):
-        meme = Guild.objects.get(_id=cfg.guild_id).memes.filter(name=name).first()
-        if meme is None:
+        guild = self._modify({"memes__name": name}, inc__memes__S__use_count=1)
+        if guild is None:
             return
-        meme.use_count += 1
-        self.edit_meme(meme)
-        return meme
-    
-    def inc_caseid(self) -> None:
-        """Increments Guild.case_id, which keeps track of the next available ID to
-        use for a case.
+        return guild.memes.filter(name=name).first()
+
+    def allocate_case_ids(self, count: int = 1) -> int:
+        """Atomically reserve `count` consecutive case IDs by incrementing Guild.case_id,
+        which keeps track of the next available ID to use for a case. This is a single
+        find_one_and_update, so concurrent callers (even in other processes) can never
+        be handed the same ID.
+
+        Guild.case_id in the snapshot is not refreshed by this, so it must not be used
+        to number new cases.
+
+        Parameters
+        ----------
+        count : int
+            How many IDs to reserve.
+
+        Returns
+        -------
+        int
+            The first reserved ID; the range is `[first, first + count)`.
         """
 
-        Guild.objects(_id=cfg.guild_id).update_one(inc__case_id=1)
+        guild = Guild._get_collection().find_one_and_update(
+            {"_id": cfg.guild_id},
+            {"$inc": {"case_id": count}},
+            projection={"case_id": True},
+            return_document=ReturnDocument.BEFORE)
+        return guild["case_id"]
+
+    def next_case_id(self) -> int:
+        """Return the ID to use for a new case.
+
+        IDs are taken from a block of `cfg.case_id_block_size` IDs reserved in memory
+        with allocate_case_ids, so with a block size above 1 bursts of cases (such as
+        raid bans) don't need a database round-trip per case. IDs left in the block
+        when the bot restarts are skipped.
+
+        Returns
+        -------
+        int
+            A case ID that has not been handed out before.
+        """
+
+        with self._case_id_lock:
+            if self._next_case_id is None or self._next_case_id >= self._case_id_block_end:
+                self._next_case_id = self.allocate_case_ids(cfg.case_id_block_size)
+                self._case_id_block_end = self._next_case_id + cfg.case_id_block_size
+
+            case_id = self._next_case_id
+            self._next_case_id += 1
+        return case_id
 
     def all_rero_mappings(self):
         g = self.get_guild()
@@ -70,19 +215,12 @@ class GuildService:
         return current
 
     def add_rero_mapping(self, mapping):
-        g = self.get_guild()
-        current = g.reaction_role_mapping
         the_key = list(mapping.keys())[0]
-        current[str(the_key)] = mapping[the_key]
-        g.reaction_role_mapping = current
-        g.save()
+        self._modify(**{f"set__reaction_role_mapping__{the_key}": mapping[the_key]})
 
     def append_rero_mapping(self, message_id, mapping):
-        g = self.get_guild()
-        current = g.reaction_role_mapping
-        current[str(message_id)] = current[str(message_id)] | mapping
-        g.reaction_role_mapping = current
-        g.save()
+        current = self.get_guild().reaction_role_mapping
+        self._modify(**{f"set__reaction_role_mapping__{message_id}": current[str(message_id)] | mapping})
 
     def get_rero_mapping(self, id):
         g = self.get_guild()
@@ -92,67 +230,92 @@ class GuildService:
             return None
 
     def delete_rero_mapping(self, id):
-        g = self.get_guild()
-        if str(id) in g.reaction_role_mapping.keys():
-            g.reaction_role_mapping.pop(str(id))
-            g.save()
+        if str(id) in self.get_guild().reaction_role_mapping.keys():
+            self._modify(**{f"unset__reaction_role_mapping__{id}": True})
 
     def add_raid_phrase(self, phrase: str) -> bool:
         existing = self.get_guild().raid_phrases.filter(word=phrase)
         if(len(existing) > 0):
             return False
-        Guild.objects(_id=cfg.guild_id).update_one(push__raid_phrases=FilterWord(word=phrase, bypass=5, notify=True))
+        self._modify(push__raid_phrases=FilterWord(word=phrase, bypass=5, notify=True))
         return True
-    
+
     def remove_raid_phrase(self, phrase: str):
-        Guild.objects(_id=cfg.guild_id).update_one(pull__raid_phrases__word=FilterWord(word=phrase).word)
+        self._modify(pull__raid_phrases__word=FilterWord(word=phrase).word)
 
     def set_spam_mode(self, mode) -> None:
-        Guild.objects(_id=cfg.guild_id).update_one(set__ban_today_spam_accounts=mode)
+        self._modify(set__ban_today_spam_accounts=mode)
 
     def add_filtered_word(self, fw: FilterWord) -> None:
         existing = self.get_guild().filter_words.filter(word=fw.word)
         if(len(existing) > 0):
             return False
 
-        Guild.objects(_id=cfg.guild_id).update_one(push__filter_words=fw)
+        self._modify(push__filter_words=fw)
         return True
 
     def remove_filtered_word(self, word: str):
-        return Guild.objects(_id=cfg.guild_id).update_one(pull__filter_words__word=FilterWord(word=word).word)
+        return self._modify(pull__filter_words__word=FilterWord(word=word).word) is not None
 
     def update_filtered_word(self, word: FilterWord):
-        return Guild.objects(_id=cfg.guild_id, filter_words__word=word.word).update_one(set__filter_words__S=word)
+        return self._modify({"filter_words__word": word.word}, set__filter_words__S=word) is not None
+
+    def record_filter_hits(self, filter_list: str, hits: dict) -> int:
+        """Add hit counts of a filter list (as returned by HitCounter.drain) to the
+        filter_hits collection, in a single unordered bulk_write.
+
+        Parameters
+        ----------
+        filter_list : str
+            Name of the Guild field the words are from, e.g. "filter_words"
+        hits : dict
+            Maps each word to a (hits, timestamp of the last hit) tuple
+
+        Returns
+        -------
+        int
+            How many words were updated.
+        """
+
+        if not hits:
+            return 0
+
+        requests = [
+            UpdateOne(
+                {"filter_list": filter_list, "word": word},
+                {"$inc": {"hits": count}, "$max": {"last_hit": datetime.fromtimestamp(last_hit)}},
+                upsert=True)
+            for word, (count, last_hit) in hits.items()
+        ]
+        FilterHit._get_collection().bulk_write(requests, ordered=False)
+        return len(requests)
+
+    def get_filter_hits(self, filter_list: str) -> dict:
+        """Returns the recorded hits of the entries of a filter list, by word."""
+
+        return {hit.word: hit for hit in FilterHit.objects(filter_list=filter_list)}
 
     def add_whitelisted_guild(self, id: int):
-        g = Guild.objects(_id=cfg.guild_id)
-        g2 = g.first()
-        if id not in g2.filter_excluded_guilds:
-            g.update_one(push__filter_excluded_guilds=id)
+        if id not in self.get_guild().filter_excluded_guilds:
+            self._modify(push__filter_excluded_guilds=id)
             return True
         return False
 
     def remove_whitelisted_guild(self, id: int):
-        g = Guild.objects(_id=cfg.guild_id)
-        g2 = g.first()
-        if id in g2.filter_excluded_guilds:
-            g.update_one(pull__filter_excluded_guilds=id)
+        if id in self.get_guild().filter_excluded_guilds:
+            self._modify(pull__filter_excluded_guilds=id)
             return True
         return False
 
     def add_ignored_channel(self, id: int):
-        g = Guild.objects(_id=cfg.guild_id)
-        g2 = g.first()
-        if id not in g2.filter_excluded_channels:
-            g.update_one(push__filter_excluded_channels=id)
+        if id not in self.get_guild().filter_excluded_channels:
+            self._modify(push__filter_excluded_channels=id)
             return True
         return False
 
     def remove_ignored_channel(self, id: int):
-        g = Guild.objects(_id=cfg.guild_id)
-        g2 = g.first()
-        if id in g2.filter_excluded_channels:
-            g.update_one(pull__filter_excluded_channels=id)
+        if id in self.get_guild().filter_excluded_channels:
+            self._modify(pull__filter_excluded_channels=id)
             return True
         return False
 
@@ -160,14 +323,17 @@ class GuildService:
         return self.get_guild().locked_channels
 
     def add_locked_channels(self, channel):
-        Guild.objects(_id=cfg.guild_id).update_one(push__locked_channels=channel)
+        self._modify(push__locked_channels=channel)
 
     def remove_locked_channels(self, channel):
-        Guild.objects(_id=cfg.guild_id).update_one(pull__locked_channels=channel)
+        self._modify(pull__locked_channels=channel)
+
+    def set_emoji_logging_webhook(self, webhook: str) -> None:
+        self._modify(set__emoji_logging_webhook=webhook)
 
     def set_nsa_mapping(self, channel_id, webhooks):
-        guild = Guild.objects(_id=cfg.guild_id).first()
-        guild.nsa_mapping[str(channel_id)] = webhooks
-        guild.save()
+        self._modify(**{f"set__nsa_mapping__{channel_id}": webhooks})
 
-guild_service = GuildService()
\ No newline at end of file
+# reads that are answered from the snapshot don't touch the database and stay synchronous
+guild_service = AsyncService(GuildService(), passthrough=(
+    "get_guild", "replace_snapshot", "all_rero_mappings", "get_rero_mapping", "get_locked_channels"))
\ No newline at end of file
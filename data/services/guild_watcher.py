@@ -0,0 +1,121 @@
+import threading
+import time
+
+from data.model.guild import Guild
+from data.services.guild_service import GuildService
+from pymongo.errors import OperationFailure, PyMongoError
+from utils.config import cfg
+from utils.logger import logger
+
+# fields that change without the configuration changing, e.g. whenever case IDs are reserved
+COUNTER_FIELDS = {"case_id", "config_version"}
+
+
+class GuildWatcher:
+    """Keeps the Guild snapshot of a GuildService in sync with changes made to the
+    `guilds` collection by someone else, like a second bot instance or an admin
+    editing the database by hand.
+
+    Changes are picked up from a MongoDB change stream when the server supports them
+    (replica sets and Atlas). Otherwise we fall back to polling Guild.config_version,
+    which every write made through GuildService increments. Manual edits are only
+    noticed in polling mode if they bump `config_version` as well.
+    """
+
+    def __init__(self, service: GuildService, poll_interval: float = 30.0):
+        """Initialize the watcher.
+
+        Parameters
+        ----------
+        service : GuildService
+            The service whose snapshot we keep up to date.
+        poll_interval : float
+            Seconds between two config_version checks when change streams are unavailable.
+
+        """
+
+        self.service = service
+        self.poll_interval = poll_interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="guild-watcher", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def _run(self) -> None:
+        try:
+            self._watch()
+        except OperationFailure as e:
+            logger.info(f"Guild change streams are unavailable ({e.details.get('errmsg') if e.details else e}), polling config_version every {self.poll_interval} seconds instead.")
+            self._poll()
+
+    def _watch(self) -> None:
+        """Follow the change stream of the main guild's document. An OperationFailure
+        before the first stream was opened means change streams aren't supported and is
+        passed on to the caller, anything after that is retried.
+
+        Update events don't carry the full document, it's only loaded for updates that
+        changed the configuration, see _apply.
+        """
+
+        pipeline = [{"$match": {"documentKey._id": cfg.guild_id}}]
+        resume_token = None
+        opened = False
+
+        while not self._stopped.is_set():
+            try:
+                with Guild._get_collection().watch(pipeline, resume_after=resume_token, max_await_time_ms=1000) as stream:
+                    if opened:
+                        # we might have missed events while reconnecting
+                        self.service.refresh()
+                    opened = True
+
+                    while not self._stopped.is_set() and stream.alive:
+                        change = stream.try_next()
+                        resume_token = stream.resume_token
+                        if change is not None:
+                            self._apply(change)
+            except OperationFailure:
+                if not opened:
+                    raise
+                # most likely the resume token fell off the oplog, start over from now
+                logger.warn("Guild change stream failed, reopening it.")
+                resume_token = None
+                time.sleep(1)
+            except PyMongoError as e:
+                logger.warn(f"Guild change stream interrupted: {e}")
+                time.sleep(5)
+
+    def _apply(self, change: dict) -> None:
+        document = change.get("fullDocument")
+        if change["operationType"] == "delete":
+            logger.error(f"The Guild document for {cfg.guild_id} was deleted! Keeping the last known configuration.")
+        elif change["operationType"] == "update":
+            description = change.get("updateDescription", {})
+            updated = description.get("updatedFields", {})
+            if not description.get("removedFields"):
+                if COUNTER_FIELDS.issuperset(updated):
+                    return
+                if "config_version" in updated and updated["config_version"] <= self.service.get_guild().config_version:
+                    # written through our own service, which already swapped in the new snapshot
+                    return
+            self.service.refresh()
+        elif document is not None:
+            self.service.replace_snapshot(Guild._from_son(document))
+        else:
+            self.service.refresh()
+
+    def _poll(self) -> None:
+        collection = Guild._get_collection()
+        while not self._stopped.wait(self.poll_interval):
+            try:
+                latest = collection.find_one({"_id": cfg.guild_id}, {"config_version": 1})
+            except PyMongoError as e:
+                logger.warn(f"Could not poll Guild config_version: {e}")
+                continue
+
+            if latest is not None and latest.get("config_version", 0) > self.service.get_guild().config_version:
+                self.service.refresh()
@@ -1,12 +1,40 @@
-from typing import Counter
-from data.model.case import Case
+import threading
+
+from data.model.case import RAID_REASON_CATEGORIES, Case
 from data.model.cases import Cases
+from data.model.karma_event import KarmaEvent
 from data.model.user import User
+from data.services.async_service import AsyncService
+from pymongo import UpdateOne
+from utils.cache import LRUCache
+from utils.config import cfg
+from utils.logger import logger
+
+# marks a cache miss, since None is cached for users without a document
+_MISSING = object()
 
 class UserService:
+    def __init__(self, upsert_batch_size: int = 100, upsert_flush_interval: float = 2.0, cache_size: int = 5000, cache_ttl: float = 300.0):
+        # raw User documents (or None if the user has none) by user ID
+        self.user_cache = LRUCache(maxsize=cache_size, ttl=cache_ttl)
+        # field updates waiting to be written in one bulk_write, by user ID
+        self._pending_upserts = {}
+        # updates taken out of _pending_upserts by a flush that hasn't been acknowledged yet
+        self._flushing_upserts = {}
+        self._pending_lock = threading.Lock()
+        # only one flush at a time, so a batch that fails can be put back in order
+        self._flush_lock = threading.Lock()
+        self._flush_timer = None
+        self.upsert_batch_size = upsert_batch_size
+        self.upsert_flush_interval = upsert_flush_interval
+
     def get_user(self, id: int) -> User:
         """Look up the User document of a user, whose ID is given by `id`.
-        If the user doesn't have a User document in the database, first create that.
+        If the user doesn't have a User document in the database, a default one is
+        returned without being saved; it only gets written once something changes.
+
+        Documents are served from `user_cache` when possible. Every call returns a new
+        User object, so callers are free to modify it before passing it to save_user.
 
         Parameters
         ----------
@@ -19,17 +47,30 @@ class UserService:
             The User document we found from the database.
         """
 
-        user = User.objects(_id=id).first()
-        # first we ensure this user has a User document in the database before continuing
-        if not user:
+        son = self.user_cache.get(id, _MISSING)
+        if son is _MISSING:
+            # not cached if the user is written to while we read, the read may predate the write
+            reservation = self.user_cache.reserve(id)
+            son = User.objects(_id=id).as_pymongo().first()
+            self.user_cache.set(id, son, reservation)
+
+        if son is not None:
+            user = User._from_son(son)
+        else:
             user = User()
             user._id = id
-            user.save()
+
+        # apply updates that haven't been written to the database yet
+        with self._pending_lock:
+            for updates in (self._flushing_upserts, self._pending_upserts):
+                for field, value in updates.get(id, {}).items():
+                    setattr(user, field, value)
         return user
 
     def get_cases(self, id: int) -> Cases:
         """Return the Document representing the cases of a user, whose ID is given by `id`
-        If the user doesn't have a Cases document in the database, first create that.
+        If the user doesn't have a Cases document in the database, an empty one is
+        returned without being saved.
 
         Parameters
         ----------
@@ -43,18 +84,15 @@ class UserService:
         """
 
         cases = Cases.objects(_id=id).first()
-        # first we ensure this user has a Cases document in the database before continuing
         if cases is None:
             cases = Cases()
             cases._id = id
-            cases.save()
         return cases
     
     def add_case(self, _id: int, case: Case) -> None:
         """Cases holds all the cases for a particular user with id `_id` as an
         EmbeddedDocumentListField. This function appends a given case object to
-        this list. If this user doesn't have any previous cases, we first add
-        a new Cases document to the database.
+        this list, creating the Cases document if this user doesn't have one yet.
 
         Parameters
         ----------
@@ -64,13 +102,43 @@ class UserService:
             The case we want to add to the user.
         """
 
-        # ensure this user has a cases document before we try to append the new case
-        self.get_cases(_id)
-        Cases.objects(_id=_id).update_one(push__cases=case)
+        # fill in the fields used by case statistics
+        case.clean()
+        Cases.objects(_id=_id).update_one(push__cases=case, upsert=True)
+
+    def add_cases(self, cases) -> int:
+        """Add many cases (e.g. of a mass ban) at once: the cases of each user are appended
+        to their Cases document, creating it if necessary, all in a single unordered bulk_write.
+        The cases must already have their IDs, see guild_service.allocate_case_ids.
+
+        Parameters
+        ----------
+        cases : Iterable[Tuple[int, Case]]
+            Pairs of the ID of the user and the case to add to them
+
+        Returns
+        -------
+        int
+            How many users got new cases.
+        """
+
+        by_user = {}
+        for _id, case in cases:
+            # fill in the fields used by case statistics
+            case.clean()
+            by_user.setdefault(_id, []).append(case.to_mongo())
+
+        if not by_user:
+            return 0
+
+        requests = [UpdateOne({"_id": _id}, {"$push": {"cases": {"$each": user_cases}}}, upsert=True)
+                    for _id, user_cases in by_user.items()]
+        Cases._get_collection().bulk_write(requests, ordered=False)
+        return len(requests)
 
     def rundown(self, id: int) -> list:
-        """Return the 3 most recent cases of a user, whose ID is given by `id`
-        If the user doesn't have a Cases document in the database, first create that.
+        """Return the 3 most recent cases of a user, whose ID is given by `id`,
+        ignoring UNMUTE cases.
 
         Parameters
         ----------
@@ -79,34 +147,61 @@ class UserService:
 
         Returns
         -------
-        Cases
-            [description]
+        list
+            List of the most recent Case objects, newest first.
         """
 
-        cases = Cases.objects(_id=id).first()
-        # first we ensure this user has a Cases document in the database before continuing
-        if cases is None:
-            cases = Cases()
-            cases._id = id
-            cases.save()
-            return []
+        return self.recent_cases(id, limit=3)
 
-        cases = cases.cases
-        cases = filter(lambda x: x._type != "UNMUTE", cases)
-        cases = sorted(cases, key=lambda i: i['date'])
-        cases.reverse()
-        return cases[0:3]
+    def recent_cases(self, id: int, limit: int = 3, exclude_types=("UNMUTE",)) -> list:
+        """Return the `limit` most recent cases of a user, newest first. Filtering and slicing
+        happens inside MongoDB, so only the returned cases are sent over the wire no matter how
+        many cases the user has.
+
+        Parameters
+        ----------
+        id : int
+            The user whose cases we want to look up.
+        limit : int
+            How many cases to return at most.
+        exclude_types : tuple
+            Case types to leave out.
+
+        Returns
+        -------
+        list
+            List of Case objects.
+        """
+
+        # cases are appended as they are created, so the newest ones are at the end
+        pipeline = [
+            {"$match": {"_id": id}},
+            {"$project": {"_id": 0, "cases": {"$slice": [{"$filter": {
+                "input": "$cases",
+                "cond": {"$and": [{"$ne": ["$$this._type", _type]} for _type in exclude_types]},
+            }}, -limit]}}},
+        ]
+        result = next(Cases.objects.aggregate(pipeline), None)
+        if result is None or not result.get("cases"):
+            return []
+        return [Case._from_son(case) for case in reversed(result["cases"])]
 
     def retrieve_birthdays(self, date):
         return User.objects(birthday=date)
     
     def transfer_profile(self, oldmember, newmember):
+        # read both users from the database rather than from a cache entry that may be stale
+        self.user_cache.invalidate(oldmember, newmember)
         u = self.get_user(oldmember)
         u._id = newmember
         u.save()
         
         u2 = self.get_user(oldmember)
         u2.save()
+        self.user_cache.invalidate(oldmember, newmember)
+
+        KarmaEvent.objects(to_id=oldmember).update(to_id=newmember)
+        KarmaEvent.objects(from_id=oldmember).update(from_id=newmember)
         
         cases = self.get_cases(oldmember)
         cases._id = newmember
@@ -119,46 +214,227 @@ class UserService:
         return u, len(cases.cases)
     
     def fetch_raids(self):
-        values = {}
-        values["Join spam"] = Cases.objects(cases__reason__contains="Join spam detected").count()
-        values["Join spam over time"] = Cases.objects(cases__reason__contains="Join spam over time detected").count()
-        values["Raid phrase"] = Cases.objects(cases__reason__contains="Raid phrase detected").count()
-        values["Ping spam"] = Cases.objects(cases__reason__contains="Ping spam").count()
-        values["Message spam"] = Cases.objects(cases__reason__contains="Message spam").count()
-        
+        """Count how many users were banned by each part of the antiraid system.
+
+        Returns
+        -------
+        dict
+            Maps each category in RAID_REASON_CATEGORIES to the number of users with such a case.
+        """
+
+        categories = list(RAID_REASON_CATEGORIES.values())
+        pipeline = [
+            {"$match": {"cases.reason_category": {"$in": categories}}},
+            {"$unwind": "$cases"},
+            {"$match": {"cases.reason_category": {"$in": categories}}},
+            # count every user once per category
+            {"$group": {"_id": {"category": "$cases.reason_category", "user": "$_id"}}},
+            {"$group": {"_id": "$_id.category", "count": {"$sum": 1}}},
+        ]
+
+        values = {category: 0 for category in categories}
+        for result in Cases.objects.aggregate(pipeline):
+            values[result["_id"]] = result["count"]
         return values
 
     def fetch_cases_by_mod(self, _id):
+        """Count the cases made by a moderator, grouped by their (normalized) reason.
+
+        Parameters
+        ----------
+        _id : int
+            ID of the moderator
+
+        Returns
+        -------
+        dict
+            `total` is the number of cases made by the moderator, `counts` is a list of
+            (reason, count) tuples, most common reason first.
+        """
+
+        pipeline = [
+            {"$match": {"cases.mod_id": int(_id)}},
+            {"$unwind": "$cases"},
+            {"$match": {"cases.mod_id": int(_id)}},
+            {"$group": {"_id": "$cases.normalized_reason", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1}},
+        ]
+        results = list(Cases.objects.aggregate(pipeline))
+
         values = {}
-        cases = Cases.objects(cases__mod_id=str(_id))
-        values["total"] = 0
-        cases = list(cases.all())
-        final_cases = []
-        for case in cases:
-            for c in case.cases:
-                final_cases.append(c)
-                values["total"] += 1
- 
-        def get_case_reason(reason):
-            string = reason.lower()
-            return ''.join(e for e in string if e.isalnum() or e == " ").strip()
-        case_reasons = [get_case_reason(case.reason) for case in final_cases if get_case_reason(case.reason) != "temporary mute expired"]
-        values["counts"] = sorted(Counter(case_reasons).items(), key=lambda item: item[1])
-        values["counts"].reverse()
+        values["total"] = sum(result["count"] for result in results)
+        values["counts"] = [(result["_id"], result["count"]) for result in results if result["_id"] != "temporary mute expired"]
         return values
 
+    def save_user(self, user: User) -> None:
+        user.save()
+        self.user_cache.invalidate(user._id)
+
+    def save_cases(self, cases: Cases) -> None:
+        cases.save()
+
     def set_sticky_roles(self, _id: int, roles) -> None:
-        self.get_user(_id)
-        User.objects(_id=_id).update_one(set__sticky_roles=roles)
+        self.queue_upsert(_id, sticky_roles=roles)
+
+    def queue_upsert(self, _id: int, **fields) -> None:
+        """Queue an update of some fields of a User document. Updates are coalesced
+        per user and written in a single unordered bulk_write, either once
+        `upsert_batch_size` users have pending updates or after `upsert_flush_interval`
+        seconds. Until then, get_user already returns the new values.
+
+        A document is only created for users whose new values differ from the defaults,
+        so e.g. storing no sticky roles for a fresh account doesn't insert anything.
+
+        Parameters
+        ----------
+        _id : int
+            ID of the user to update
+        **fields
+            The fields of User to set, and their new values
+        """
+
+        self.user_cache.invalidate(_id)
+        with self._pending_lock:
+            self._pending_upserts.setdefault(_id, {}).update(fields)
+            flush_now = len(self._pending_upserts) >= self.upsert_batch_size
+            if not flush_now:
+                self._start_flush_timer()
+
+        if flush_now:
+            self.flush_upserts()
+
+    def flush_upserts(self) -> int:
+        """Write all queued User updates to the database. Until the write is acknowledged,
+        get_user keeps returning the new values. If it fails, the updates are queued again
+        (under any newer ones for the same fields) and retried after `upsert_flush_interval`.
+
+        Returns
+        -------
+        int
+            How many users were updated.
+        """
+
+        with self._flush_lock:
+            with self._pending_lock:
+                pending, self._pending_upserts = self._pending_upserts, {}
+                self._flushing_upserts = pending
+                if self._flush_timer is not None:
+                    self._flush_timer.cancel()
+                    self._flush_timer = None
+
+            if not pending:
+                return 0
+
+            try:
+                requests = []
+                for _id, fields in pending.items():
+                    update = {User._fields[field].db_field: User._fields[field].to_mongo(value) for field, value in fields.items()}
+                    requests.append(UpdateOne({"_id": _id}, {"$set": update}, upsert=any(
+                        value != self._field_default(field) for field, value in fields.items())))
+
+                User._get_collection().bulk_write(requests, ordered=False)
+            except Exception:
+                with self._pending_lock:
+                    for _id, fields in pending.items():
+                        self._pending_upserts[_id] = {**fields, **self._pending_upserts.get(_id, {})}
+                    self._flushing_upserts = {}
+                    self._start_flush_timer()
+                raise
+
+            self.user_cache.invalidate(*pending)
+            with self._pending_lock:
+                self._flushing_upserts = {}
+            return len(requests)
+
+    def _flush_from_timer(self) -> None:
+        # nobody would see an exception raised on the timer thread, the failed updates
+        # have been queued again and the next flush is scheduled at this point
+        try:
+            self.flush_upserts()
+        except Exception as e:
+            logger.error(f"Failed to write queued user updates, retrying in {self.upsert_flush_interval} seconds: {e}")
+
+    def _start_flush_timer(self) -> None:
+        # must be called with _pending_lock held
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(self.upsert_flush_interval, self._flush_from_timer)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def _field_default(self, field: str):
+        default = User._fields[field].default
+        return default() if callable(default) else default
+
+    def add_karma(self, giver_id: int, receiver_id: int, amount: int, reason: str) -> int:
+        """Record a karma change in the karma_events ledger and apply it to the receiver's total.
+
+        Parameters
+        ----------
+        giver_id : int
+            ID of the user who gave (or took) the karma
+        receiver_id : int
+            ID of the user whose karma changes
+        amount : int
+            How much karma to give, negative to take karma away
+        reason : str
+            Reason given for the change
+
+        Returns
+        -------
+        int
+            The receiver's karma after the change.
+        """
+
+        KarmaEvent(from_id=giver_id, to_id=receiver_id, amount=amount, reason=reason).save()
+        receiver = User.objects(_id=receiver_id).modify(upsert=True, new=True, inc__karma=amount)
+        self.user_cache.invalidate(receiver_id)
+        return receiver.karma
+
+    def set_karma(self, _id: int, karma: int) -> None:
+        User.objects(_id=_id).update_one(upsert=True, set__karma=karma)
+        self.user_cache.invalidate(_id)
+
+    def karma_history_count(self, _id: int, received: bool = True) -> int:
+        """Count the karma events a user received (or gave, if `received` is False)."""
+
+        if received:
+            return KarmaEvent.objects(to_id=_id).count()
+        return KarmaEvent.objects(from_id=_id).count()
+
+    def karma_history(self, _id: int, received: bool = True, skip: int = 0, limit: int = 10) -> list:
+        """Return a page of the karma events a user received (or gave, if `received` is False),
+        newest first.
+
+        Parameters
+        ----------
+        _id : int
+            The user whose history we want
+        received : bool
+            Whether to look at karma the user received or karma they gave
+        skip : int
+            How many of the newest events to skip
+        limit : int
+            Maximum number of events to return
+
+        Returns
+        -------
+        list
+            List of KarmaEvent documents.
+        """
+
+        if received:
+            events = KarmaEvent.objects(to_id=_id)
+        else:
+            events = KarmaEvent.objects(from_id=_id)
+        return list(events.order_by('-date').skip(skip).limit(limit))
 
     def karma_rank(self, _id) -> list:
         karma = self.get_user(_id).karma
-        users = User.objects().only('_id', 'karma')
-        overall = users().count()
-        rank = users(karma__gte=karma).count()
+        overall = User._get_collection().estimated_document_count()
+        rank = User.objects(karma__gte=karma).count()
         return karma, rank, overall
 
     def leaderboard(self):
-        return User.objects[0:30].only('_id', 'karma').order_by('-karma', '-_id').select_related()
+        return list(User.objects[0:30].only('_id', 'karma').order_by('-karma', '-_id'))
 
-user_service = UserService()
\ No newline at end of file
+user_service = AsyncService(UserService(cache_size=cfg.user_cache_size, cache_ttl=cfg.user_cache_ttl))
\ No newline at end of file
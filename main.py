@@ -2,12 +2,16 @@ import discord
 from discord.ext import commands
 
 import os
+from data.services.guild_service import guild_service
+from data.services.guild_watcher import GuildWatcher
+from data.services.user_service import user_service
 from utils.config import cfg
 from utils.context import ChromeyContext
 from utils.database import db
 from utils.logger import logger
 from utils.mod.filter import find_triggered_filters
 from utils.misc import BanCache
+from utils.mod.pipeline import ModerationPipeline
 from utils.permissions.permissions import permissions
 from utils.tasks import Tasks
 
@@ -19,6 +23,7 @@ warnings.simplefilter(action='ignore', category=FutureWarning)
 initial_extensions = [
         "cogs.monitors.filter",
         "cogs.monitors.antiraid",
+        "cogs.monitors.moderation",
         "cogs.commands.info.stats",
         "cogs.commands.info.help",
         "cogs.commands.info.userinfo",
@@ -47,11 +52,22 @@ class Bot(commands.Bot):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.tasks = Tasks(self)
+        self.moderation = ModerationPipeline()
+        self.guild_watcher = GuildWatcher(guild_service.sync)
 
         # force the config object and database connection to be loaded
         if cfg and db and permissions:
+            self.guild_watcher.start()
             logger.info("Presetup phase completed! Connecting to Discord...")
 
+    async def close(self):
+        # write profile updates that are still queued before the connection goes away
+        try:
+            await user_service.flush_upserts()
+        except Exception as e:
+            logger.error(f"Failed to write queued user updates: {e}")
+        await super().close()
+
     async def get_application_context(self, interaction: discord.Interaction, *, cls=ChromeyContext) -> ChromeyContext:
         return await super().get_application_context(interaction, cls=cls)
     
@@ -68,7 +84,7 @@ class Bot(commands.Bot):
 
         message_content = " ".join([str(option.get("value") or "") for option in options])
 
-        triggered_words = find_triggered_filters(
+        triggered_words = await find_triggered_filters(
             message_content, interaction.user)
         
         if triggered_words:
@@ -0,0 +1,51 @@
+"""
+One-shot migration that fills in Case.normalized_reason and Case.reason_category
+for cases created before those fields existed, so that /casestats and /raidstats
+count them too. It is safe to run more than once.
+"""
+
+import os
+
+import mongoengine
+from dotenv import find_dotenv, load_dotenv
+from pymongo import UpdateOne
+
+from data.model.case import normalize_reason, reason_category
+from data.model.cases import Cases
+
+load_dotenv(find_dotenv())
+
+
+def migrate():
+    print("STARTING CASE MIGRATION...")
+    Cases.ensure_indexes()
+
+    collection = Cases._get_collection()
+    requests = []
+    migrated = 0
+
+    for document in collection.find({"cases": {"$elemMatch": {"normalized_reason": {"$exists": False}}}}):
+        for case in document["cases"]:
+            reason = case.get("reason") or ""
+            case["normalized_reason"] = normalize_reason(reason)
+            case["reason_category"] = reason_category(reason)
+
+        requests.append(UpdateOne({"_id": document["_id"]}, {"$set": {"cases": document["cases"]}}))
+        if len(requests) == 500:
+            migrated += collection.bulk_write(requests, ordered=False).modified_count
+            requests = []
+
+    if requests:
+        migrated += collection.bulk_write(requests, ordered=False).modified_count
+
+    print(f"Updated cases of {migrated} users.")
+    print("DONE")
+
+if __name__ == "__main__":
+        if os.environ.get("DB_CONNECTION_STRING") is None:
+            mongoengine.register_connection(
+                host=os.environ.get("DB_HOST"), port=int(os.environ.get("DB_PORT")), alias="default", name="chromey")
+        else:
+            mongoengine.register_connection(
+                host=os.environ.get("DB_CONNECTION_STRING"), alias="default", name="chromey")
+        migrate()
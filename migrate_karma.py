@@ -0,0 +1,55 @@
+"""
+One-shot migration that moves the karma history embedded in User documents
+into the karma_events ledger. Every karma change used to be stored twice
+(in the receiver's karma_received_history and the giver's karma_given_history),
+so only the received side is copied over.
+"""
+
+import os
+
+import mongoengine
+from dotenv import find_dotenv, load_dotenv
+
+from data.model.karma_event import KarmaEvent
+from data.model.user import User
+
+load_dotenv(find_dotenv())
+
+
+def migrate():
+    print("STARTING KARMA MIGRATION...")
+    KarmaEvent.ensure_indexes()
+    User.ensure_indexes()
+
+    users = User._get_collection()
+    events = KarmaEvent._get_collection()
+    migrated = 0
+
+    for user in users.find({"karma_received_history.0": {"$exists": True}}, {"karma_received_history": True}):
+        batch = [
+            {
+                "from_id": entry["from"],
+                "to_id": user["_id"],
+                "amount": entry["amount"],
+                "reason": entry.get("reason"),
+                "date": entry["date"]
+            }
+            for entry in user["karma_received_history"]
+        ]
+
+        events.insert_many(batch, ordered=False)
+        users.update_one({"_id": user["_id"]}, {"$unset": {"karma_received_history": ""}})
+        migrated += len(batch)
+
+    users.update_many({}, {"$unset": {"karma_received_history": "", "karma_given_history": ""}})
+    print(f"Migrated {migrated} karma events.")
+    print("DONE")
+
+if __name__ == "__main__":
+        if os.environ.get("DB_CONNECTION_STRING") is None:
+            mongoengine.register_connection(
+                host=os.environ.get("DB_HOST"), port=int(os.environ.get("DB_PORT")), alias="default", name="chromey")
+        else:
+            mongoengine.register_connection(
+                host=os.environ.get("DB_CONNECTION_STRING"), alias="default", name="chromey")
+        migrate()
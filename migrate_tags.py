@@ -0,0 +1,55 @@
+"""
+One-shot migration that moves the tags embedded in the Guild document
+into their own `tags` collection. It is safe to run more than once.
+"""
+
+import os
+
+import mongoengine
+from dotenv import find_dotenv, load_dotenv
+from pymongo import UpdateOne
+
+from data.model.guild import Guild
+from data.model.tag import Tag
+
+load_dotenv(find_dotenv())
+
+def migrate():
+    print("STARTING TAG MIGRATION...")
+    guild_id = int(os.environ.get("MAIN_GUILD_ID"))
+
+    guilds = Guild._get_collection()
+    guild = guilds.find_one({"_id": guild_id}, {"tags": True})
+    if guild is None or not guild.get("tags"):
+        print("Nothing to migrate.")
+        return
+
+    # the unique (name, args) index would reject duplicates, keep the first one we see
+    seen = set()
+    requests = []
+    for tag in guild["tags"]:
+        key = (tag["name"], tag.get("args", False))
+        if key in seen:
+            print(f"Skipping duplicate tag {tag['name']} (ID {tag['_id']})")
+            continue
+
+        seen.add(key)
+        # tags that are already in the collection (from an earlier run or added since) are left alone
+        requests.append(UpdateOne({"name": key[0], "args": key[1]}, {"$setOnInsert": {**tag, "args": key[1]}}, upsert=True))
+
+    # created before inserting, so concurrent inserts of the same name can't slip through either
+    Tag.ensure_indexes()
+    result = Tag._get_collection().bulk_write(requests, ordered=False)
+    print(f"Copied {result.upserted_count} tags, {len(requests) - result.upserted_count} were already there.")
+
+    guilds.update_one({"_id": guild_id}, {"$unset": {"tags": ""}, "$inc": {"config_version": 1}})
+    print("DONE")
+
+if __name__ == "__main__":
+        if os.environ.get("DB_CONNECTION_STRING") is None:
+            mongoengine.register_connection(
+                host=os.environ.get("DB_HOST"), port=int(os.environ.get("DB_PORT")), alias="default", name="chromey")
+        else:
+            mongoengine.register_connection(
+                host=os.environ.get("DB_CONNECTION_STRING"), alias="default", name="chromey")
+        migrate()
@@ -0,0 +1,39 @@
+import pytest
+
+from utils.mod.filter_engine import MAX_BOUNDED_REPEAT, PatternError, pattern_source, validate_pattern, GLOB
+
+
+@pytest.mark.parametrize("pattern", ["a{1,1000}b", "[a-z]+[0-9]+"])
+def test_leading_unbounded_quantifier(pattern):
+    with pytest.raises(PatternError) as e:
+        validate_pattern(pattern)
+
+    message = str(e.value)
+    assert "can't start with an unbounded quantifier" in message
+    assert f"{{1,{MAX_BOUNDED_REPEAT}}}" in message
+    assert "same texts" not in message
+
+
+@pytest.mark.parametrize("pattern", ["(?i)abc", "(?s)a.b", "(?x)a b"])
+def test_global_inline_flags(pattern):
+    with pytest.raises(PatternError, match="Inline flags"):
+        validate_pattern(pattern)
+
+
+@pytest.mark.parametrize("pattern", ["abc", "(?s:a.b)", "ab+", "free\\s?nitro", "a{1,32}b", pattern_source("fr*e", GLOB)])
+def test_valid_patterns(pattern):
+    validate_pattern(pattern)
+
+
+@pytest.mark.parametrize("pattern, message", [
+    ("a(", "Invalid pattern"),
+    ("a?", "empty text"),
+    ("x.*y.*z", "at most one unbounded quantifier"),
+    ("x(a+)+y", "Nested quantifiers"),
+    ("x(a|ab)*y", "Alternations inside repeated groups"),
+    ("x\\w+\\w+y", "Adjacent quantifiers"),
+    ("(a)x\\1", "Backreferences"),
+])
+def test_rejected_patterns(pattern, message):
+    with pytest.raises(PatternError, match=message):
+        validate_pattern(pattern)
@@ -48,10 +48,7 @@ async def device_autocompleter(ctx: AutocompleteContext):
 
 
 async def tags_autocomplete(ctx: AutocompleteContext):
-    tags = [tag.name.lower() for tag in guild_service.get_guild().tags]
-    tags = list(set(tags))
-    tags.sort()
-    return [tag for tag in tags if tag.lower().startswith(ctx.value.lower())][:25]
+    return await guild_service.get_tag_names(ctx.value.lower())
 
 
 async def memes_autocomplete(ctx: AutocompleteContext):
@@ -61,8 +58,8 @@ async def memes_autocomplete(ctx: AutocompleteContext):
 
 
 async def liftwarn_autocomplete(ctx: AutocompleteContext):
-    cases: List[Case] = [case for case in user_service.get_cases(
-        int(ctx.options["user"])).cases if case._type == "WARN" and not case.lifted]
+    cases: List[Case] = [case for case in (await user_service.get_cases(
+        int(ctx.options["user"]))).cases if case._type == "WARN" and not case.lifted]
     cases.sort(key=lambda x: x._id, reverse=True)
 
     return [OptionChoice(f"{case._id} - {case.reason}", str(case._id)) for case in cases if (not ctx.value or str(case._id).startswith(str(ctx.value)))][:25]
@@ -0,0 +1,89 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Thread safe least-recently-used cache whose entries also expire after `ttl` seconds.
+
+    Once `maxsize` entries are stored, adding another one evicts the entry that was used
+    the longest time ago. `None` is a valid value, so lookups report a miss by returning
+    the `default` passed to `get`.
+
+    Values loaded from a slower source can be reserved with `reserve` before the load, so
+    that an `invalidate` racing with the load keeps the stale value out of the cache.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        # key -> token of the latest reserve, dropped again by set and invalidate
+        self._reservations = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Look up `key`, returning `default` if it's not cached or the entry expired.
+        """
+
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+
+                del self._data[key]
+
+            self.misses += 1
+            return default
+
+    def reserve(self, key) -> object:
+        """Call before loading the value of `key` and pass the result to `set` along with
+        the value. If `key` is invalidated in between, that `set` does nothing, so a value
+        read before a concurrent write can't be cached after the write invalidated it.
+        """
+
+        token = object()
+        if self.maxsize > 0:
+            with self._lock:
+                self._reservations[key] = token
+        return token
+
+    def set(self, key, value, reservation: object = None) -> None:
+        if self.maxsize <= 0:
+            return
+
+        with self._lock:
+            if reservation is not None:
+                if self._reservations.get(key) is not reservation:
+                    return
+                del self._reservations[key]
+
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, *keys) -> None:
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+                self._reservations.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._reservations.clear()
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -40,6 +40,13 @@ class Config:
 
         self.dev = os.environ.get("DEV") is not None
 
+        # how many case IDs to reserve from the database at once
+        self.case_id_block_size = int(os.environ.get("CASE_ID_BLOCK_SIZE", 1))
+
+        # how many User documents to keep in memory, and for how many seconds
+        self.user_cache_size = int(os.environ.get("USER_CACHE_SIZE", 5000))
+        self.user_cache_ttl = float(os.environ.get("USER_CACHE_TTL", 300))
+
         logger.info(
             f"Bloo will be running in: {self.guild_id} in \033[1m{'DEVELOPMENT' if self.dev else 'PRODUCTION'}\033[0m mode")
         logger.info(f"Bot owned by: {self.guild_owner_id}")
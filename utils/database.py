@@ -1,20 +1,105 @@
 import os
+import threading
+
 import mongoengine
 from data.model.guild import Guild
+from mongoengine.connection import get_connection
+from pymongo import ReadPreference, monitoring
 from utils.config import cfg
 from utils.logger import logger
 
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Keeps count of the connections in the MongoClient's connection pool.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open = 0
+        self.in_use = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.pool_clears = 0
+
+    def pool_created(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open -= 1
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.in_use += 1
+            self.checkouts += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use -= 1
+
+
 class Database:
+    """Owns the single MongoClient of the bot. mongoengine uses it as its default connection,
+    and everything else that talks to MongoDB directly (e.g. the scheduler's job store)
+    should use `db.client` instead of opening its own.
+    """
+
     def __init__(self):
         logger.info("Starting database...")
+        self.pool_metrics = PoolMetrics()
+        read_preference = os.environ.get("DB_READ_PREFERENCE", "primary")
+        if read_preference not in READ_PREFERENCES:
+            raise Exception(f"Invalid DB_READ_PREFERENCE {read_preference}, must be one of {', '.join(READ_PREFERENCES)}")
+
+        client_options = dict(
+            maxPoolSize=int(os.environ.get("DB_MAX_POOL_SIZE", 50)),
+            minPoolSize=int(os.environ.get("DB_MIN_POOL_SIZE", 0)),
+            serverSelectionTimeoutMS=int(os.environ.get("DB_SERVER_SELECTION_TIMEOUT_MS", 30000)),
+            connectTimeoutMS=int(os.environ.get("DB_CONNECT_TIMEOUT_MS", 20000)),
+            read_preference=READ_PREFERENCES[read_preference],
+            event_listeners=[self.pool_metrics],
+        )
+
         if os.environ.get("DB_CONNECTION_STRING") is None:
             mongoengine.register_connection(
-                host=os.environ.get("DB_HOST"), port=int(os.environ.get("DB_PORT")), alias="default", name="chromey")
+                host=os.environ.get("DB_HOST"), port=int(os.environ.get("DB_PORT")), alias="default", name="chromey", **client_options)
         else:
             mongoengine.register_connection(
-                host=os.environ.get("DB_CONNECTION_STRING"), alias="default", name="chromey")
+                host=os.environ.get("DB_CONNECTION_STRING"), alias="default", name="chromey", **client_options)
+
+        self.client = get_connection("default")
+        self.max_pool_size = client_options["maxPoolSize"]
         logger.info("Database connected and loaded successfully!")
-        
+
         if not Guild.objects(_id=cfg.guild_id):
             raise Exception(f"The database has not been set up for guild {cfg.guild_id}! Please refer to README.md.")
 
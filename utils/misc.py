@@ -1,10 +1,12 @@
 import asyncio
 import json
+from typing import Optional
 
 import aiohttp
 import discord
 from data.services.guild_service import guild_service
 
+from utils.cache import LRUCache
 from utils.config import cfg
 from utils.logger import logger
 
@@ -27,6 +29,71 @@ class BanCache:
         self.cache.discard(user_id)
 
 
+class InviteCache:
+    """Remembers which guild an invite code points to, so the invite filter doesn't have to
+    ask the API about the same invite again. Invites that don't exist are remembered for a
+    shorter time, and concurrent lookups of the same code share one API request.
+    """
+
+    def __init__(self, bot, ttl: float = 3600, not_found_ttl: float = 300, maxsize: int = 4096):
+        self.bot = bot
+        self.cache = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.not_found = LRUCache(maxsize=maxsize, ttl=not_found_ttl)
+        self.pending = {}
+
+    async def resolve(self, invite: str) -> Optional[int]:
+        """Look up the ID of the guild an invite belongs to.
+
+        Parameters
+        ----------
+        invite : str
+            Invite URL or code
+
+        Returns
+        -------
+        Optional[int]
+            ID of the guild, or None if the invite doesn't exist
+        """
+
+        code = invite.rstrip("/").rsplit("/", 1)[-1]
+        guild_id = self.cache.get(code)
+        if guild_id is not None:
+            return guild_id
+        if self.not_found.get(code, False):
+            return None
+
+        lookup = self.pending.get(code)
+        if lookup is None:
+            lookup = self.pending[code] = asyncio.ensure_future(self.fetch(code))
+            lookup.add_done_callback(lambda _: self.pending.pop(code, None))
+
+        # shielded so that one cancelled waiter doesn't cancel the lookup for the others
+        return await asyncio.shield(lookup)
+
+    async def fetch(self, code: str) -> Optional[int]:
+        try:
+            invite = await self.bot.fetch_invite(code, with_counts=False)
+        except discord.NotFound:
+            self.not_found.set(code, True)
+            return None
+
+        guild_id = None
+        if isinstance(invite, discord.Invite):
+            if invite.guild is not None:
+                guild_id = invite.guild.id
+            else:
+                guild_id = 123
+        elif isinstance(invite, discord.PartialInviteGuild) or isinstance(invite, discord.PartialInviteChannel):
+            guild_id = invite.id
+
+        if guild_id is None:
+            # a cached None would read as a miss, so remember it like an invite that doesn't exist
+            self.not_found.set(code, True)
+        else:
+            self.cache.set(code, guild_id)
+        return guild_id
+
+
 async def fetch_ban_cache(bot, ban_cache: BanCache):
     """Fetches ban cache
 
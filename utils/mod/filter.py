@@ -1,48 +1,120 @@
+import asyncio
 import discord
-import string
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
-from fold_to_ascii import fold
 from data.model.filterword import FilterWord
 from data.services.guild_service import guild_service
+from utils.cache import LRUCache
+from utils.logger import logger
+from utils.mod.filter_engine import HitCounter, LeveledFilter, fingerprint
+from utils.mod.normalize import NormalizedText, normalize
 from utils.permissions.permissions import permissions
 
-def find_triggered_filters(input, member: discord.Member) -> List[FilterWord]:
+# name of the Guild field -> LeveledFilter compiled from it
+_compiled_lists = {}
+# lists with regex or glob entries are matched here instead of on the event loop
+_pattern_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="filter")
+# name of the Guild field -> verdicts of its LeveledFilter
+verdict_caches = {
+    "filter_words": LRUCache(maxsize=4096, ttl=3600),
+    "raid_phrases": LRUCache(maxsize=4096, ttl=3600),
+}
+# name of the Guild field -> hits of its entries that haven't been written to the database yet
+hit_counters = {
+    "filter_words": HitCounter(),
+    "raid_phrases": HitCounter(),
+}
+
+
+def _timeout_logger(field: str):
+    def on_timeout(level: int) -> None:
+        logger.warning(f"The {field} patterns ran out of time on a message (level {level}), only the entries that matched in time were applied.")
+    return on_timeout
+
+
+def _compiled_list(field: str, **options) -> LeveledFilter:
+    words = getattr(guild_service.get_guild(), field)
+    compiled = _compiled_lists.get(field)
+    if compiled is not None and compiled.source is not words and compiled.fingerprint == fingerprint(words):
+        # the snapshot was replaced because of some other change to the guild (like a new case ID),
+        # the entries are the same so the compiled list and its verdicts are still good
+        compiled.source = words
+    elif compiled is None or compiled.source is not words:
+        # the list changed (e.g. through add_filtered_word), verdicts of the old one are useless now
+        verdict_caches[field].clear()
+        compiled = _compiled_lists[field] = LeveledFilter(words, verdict_cache=verdict_caches[field], hit_counter=hit_counters[field],
+                                                          on_timeout=_timeout_logger(field), **options)
+        # the list compiled for a level below any bypass has every entry, so it reports every rejected pattern
+        for word, reason in compiled.for_level(-1).rejected:
+            logger.warning(f"Skipping {field} pattern `{word.word}`: {reason}")
+    return compiled
+
+
+def compiled_filter() -> LeveledFilter:
+    """Return the guild's filter list compiled for matching. It's compiled again only
+    when the entries of the list changed, its `version` stays the same until then.
+    """
+
+    return _compiled_list("filter_words")
+
+
+def compiled_raid_phrases() -> LeveledFilter:
+    """Return the guild's raid phrases compiled for matching, see compiled_filter.
+    """
+
+    return _compiled_list("raid_phrases", match_stripped_words=False)
+
+
+async def _find(compiled: LeveledFilter, normalized: NormalizedText, level: int) -> list:
+    if not compiled.has_patterns:
+        return compiled.find(normalized, level)
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_pattern_executor, compiled.find, normalized, level)
+
+
+async def find_triggered_filters(input, member: discord.Member, normalized: NormalizedText = None, level: int = None) -> List[FilterWord]:
     """
     BAD WORD FILTER
+
+    `normalized` can be passed in if the input has already been normalized,
+    e.g. by normalize_message, and `level` if the member's permission level is known.
     """
-    symbols = (u"абвгдеёжзийклмнопрстуфхцчшщъыьэюяАБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯ",
-               u"abBrdeex3nnKnmHonpcTyoxu4wwbbbeoRABBrDEEX3NNKNMHONPCTyOXU4WWbbbEOR")
 
-    tr = {ord(a): ord(b) for a, b in zip(*symbols)}
+    if normalized is None:
+        normalized = normalize(input)
+    if level is None:
+        level = permissions.get_level(member.guild, member)
 
-    input_lowercase = fold(input.translate(tr).lower()).lower()
-    folded_without_spaces = "".join(input_lowercase.split())
-    folded_without_spaces_and_punctuation = folded_without_spaces.translate(
-        str.maketrans('', '', string.punctuation))
+    return await _find(compiled_filter(), normalized, level)
 
-    db_guild = guild_service.get_guild()
 
-    if not input_lowercase:
-        return []
-    # reported = False
+async def find_triggered_raid_phrases(normalized: NormalizedText, member: discord.Member, level: int = None) -> List[FilterWord]:
+    """Find the raid phrases that occur in a normalized text, ignoring the ones `member` can bypass.
+    """
 
-    words_found = []
-    for word in db_guild.filter_words:
-        if permissions.has(member.guild, member, word.bypass):
-            continue
+    if level is None:
+        level = permissions.get_level(member.guild, member)
 
-        filter_word_without_spaces = "".join(word.word.lower().split())
-        if (word.word.lower() in input_lowercase) or \
-            (not word.false_positive and word.word.lower() in folded_without_spaces) or \
-                (not word.false_positive and word.word.lower() in folded_without_spaces_and_punctuation or \
-                    (not word.false_positive and filter_word_without_spaces in folded_without_spaces_and_punctuation)):
+    return await _find(compiled_raid_phrases(), normalized, level)
 
-            # remove all whitespace, punctuation in message and run filter again
-            if word.false_positive and word.word.lower() not in input_lowercase.split():
-                continue
 
-            if word.notify:
-                return [word]
+async def flush_filter_hits() -> int:
+    """Write the hits recorded since the last flush to the database, in one bulk_write per list.
+    If writing fails, the hits are kept for the next flush.
+
+    Returns
+    -------
+    int
+        How many entries were updated.
+    """
 
-            words_found.append(word)
-    return words_found
+    updated = 0
+    for field, counter in hit_counters.items():
+        hits = counter.drain()
+        try:
+            updated += await guild_service.record_filter_hits(field, hits)
+        except Exception:
+            counter.restore(hits)
+            raise
+    return updated
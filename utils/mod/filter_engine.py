@@ -0,0 +1,535 @@
+import hashlib
+import itertools
+import re
+import threading
+import time
+from collections import deque
+from typing import Callable, Iterable, List, Set, Tuple
+
+import regex
+
+try:
+    from re import _constants as sre_constants
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_constants
+    import sre_parse
+
+# every LeveledFilter gets its own version, used to key cached verdicts
+_versions = itertools.count(1)
+
+# FilterWord.kind values
+LITERAL = "literal"
+REGEX = "regex"
+GLOB = "glob"
+KINDS = (LITERAL, REGEX, GLOB)
+
+# limits that keep compiling and running the combined pattern of a filter list cheap
+MAX_PATTERN_LENGTH = 256
+MAX_COMBINED_PATTERN_LENGTH = 16384
+# repeats with a higher upper bound than this are treated like unbounded ones
+MAX_BOUNDED_REPEAT = 32
+# seconds the regex and glob entries get per text, spread over all of its variants
+PATTERN_TIME_BUDGET = 0.05
+
+_REPEATS = {sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT}
+if hasattr(sre_constants, "POSSESSIVE_REPEAT"):
+    _REPEATS.add(sre_constants.POSSESSIVE_REPEAT)
+
+
+def fingerprint(words) -> bytes:
+    """Digest of everything about a filter list that matching depends on, so a list that was
+    loaded again (e.g. with a new Guild snapshot) can be told apart from one that changed.
+    """
+
+    digest = hashlib.blake2b(digest_size=16)
+    for word in words:
+        entry = (word.word, word.bypass, word.notify, word.false_positive, getattr(word, "kind", LITERAL))
+        digest.update(repr(entry).encode())
+    return digest.digest()
+
+
+class PatternError(ValueError):
+    """Raised for regex or glob filter entries that are invalid or could be too slow to match."""
+
+
+def pattern_source(word: str, kind: str) -> str:
+    """Return the regular expression for a filter entry of kind REGEX or GLOB.
+    In globs, `*` stands for any run of non-space characters and `?` for exactly one.
+    """
+
+    if kind == GLOB:
+        return "".join(r"\S*?" if char == "*" else r"\S" if char == "?" else regex.escape(char) for char in word)
+    return word
+
+
+def validate_pattern(source: str) -> None:
+    """Make sure a regular expression can be used as a filter entry.
+
+    Besides syntax errors, patterns that match the empty text and inline flags that apply
+    to the whole pattern (like `(?i)`, scoped ones like `(?s:...)` are fine), this rejects
+    everything that makes the time to search a text grow faster than about linearly with its
+    length: more than one unbounded quantifier (like `*`, `+` or `{0,100}`) per alternative,
+    so also globs with more than one `*`, quantifiers or alternations inside repeated groups
+    (like `(a+)+` or `(a|ab)*`), adjacent quantifiers that can match the same characters (like
+    `\\S*?\\S+`), patterns that start with an unbounded quantifier, and backreferences.
+
+    Raises
+    ------
+    PatternError
+        If the pattern can't be used.
+    """
+
+    if len(source) > MAX_PATTERN_LENGTH:
+        raise PatternError(f"Patterns can be at most {MAX_PATTERN_LENGTH} characters long.")
+
+    try:
+        # compiled on its own the way it will be combined
+        compiled = regex.compile(f"(?:{source})", regex.IGNORECASE)
+        parsed = sre_parse.parse(source)
+    except (regex.error, re.error) as e:
+        raise PatternError(f"Invalid pattern: {e}")
+
+    if parsed.state.flags & ~re.UNICODE:
+        # in the combined pattern they would change how every other entry matches
+        raise PatternError("Inline flags like `(?i)` or `(?s)` that apply to the whole pattern aren't allowed, use a scoped group like `(?s:...)` instead. Patterns are always case insensitive.")
+
+    if compiled.fullmatch(""):
+        raise PatternError("Patterns that match an empty text would match every message.")
+
+    items = list(parsed)
+    if items and _is_unbounded(items[0]):
+        raise PatternError(f"Patterns can't start with an unbounded quantifier like `*`, `+` or a repeat of more than {MAX_BOUNDED_REPEAT} like `{{1,100}}`, "
+                           f"searching for them takes time that grows with the square of the message length. "
+                           f"Start with a fixed character or use a bounded repeat like `{{1,{MAX_BOUNDED_REPEAT}}}`.")
+
+    _check_backtracking(items)
+
+
+def _repeat_bound(item) -> int:
+    op, av = item
+    return av[1] if op in _REPEATS else 1
+
+
+def _is_unbounded(item) -> bool:
+    return _repeat_bound(item) > MAX_BOUNDED_REPEAT
+
+
+def _overlaps(first, second) -> bool:
+    """Whether two repeated items could match the same characters. Only repeats of two
+    different single characters are known not to.
+    """
+
+    first_body, second_body = list(first[1][2]), list(second[1][2])
+    if len(first_body) == len(second_body) == 1:
+        (first_op, first_char), (second_op, second_char) = first_body[0], second_body[0]
+        if first_op == second_op == sre_constants.LITERAL:
+            return chr(first_char).lower() == chr(second_char).lower()
+    return True
+
+
+def _check_backtracking(parsed, in_repeat: bool = False) -> int:
+    """Walk a sequence of a parsed pattern, raising PatternError on risky constructs.
+    Returns the number of unbounded quantifiers in it.
+    """
+
+    unbounded = 0
+    previous = None
+    for item in parsed:
+        op, av = item
+        if op in _REPEATS:
+            repeats = av[1] > 1
+            if repeats and in_repeat:
+                raise PatternError("Nested quantifiers like `(a+)+` aren't allowed, they can take exponential time to match.")
+            if repeats and previous is not None and _repeat_bound(previous) > 1 and \
+                    (_is_unbounded(item) or _is_unbounded(previous)) and _overlaps(previous, item):
+                raise PatternError("Adjacent quantifiers that can match the same characters (like `\\w+\\w+`) aren't allowed, they can take very long to match.")
+            unbounded += _is_unbounded(item) + _check_backtracking(av[2], in_repeat or repeats)
+        elif op == sre_constants.BRANCH:
+            if in_repeat:
+                raise PatternError("Alternations inside repeated groups like `(a|ab)*` aren't allowed, they can take exponential time to match.")
+            # each alternative gets its own allowance
+            unbounded += max(_check_backtracking(branch, in_repeat) for branch in av[1])
+        elif op == sre_constants.SUBPATTERN:
+            unbounded += _check_backtracking(av[-1], in_repeat)
+        elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            unbounded += _check_backtracking(av[1], in_repeat)
+        elif op == getattr(sre_constants, "ATOMIC_GROUP", None):
+            unbounded += _check_backtracking(av, in_repeat)
+        elif op in (sre_constants.GROUPREF, sre_constants.GROUPREF_EXISTS):
+            raise PatternError("Backreferences aren't allowed.")
+
+        if unbounded > 1:
+            raise PatternError("Patterns can have at most one unbounded quantifier like `*`, `+` or `{0,100}` (globs at most one `*`) per alternative, more can take very long to match.")
+        previous = item
+    return unbounded
+
+
+class AhoCorasick:
+    """Multi-pattern substring matcher. All patterns are compiled into a single automaton,
+    so finding every pattern that occurs in a text takes one pass over the text,
+    no matter how many patterns there are.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+
+        for pattern_id, pattern in enumerate(patterns):
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                    self._goto[state][char] = next_state
+                state = next_state
+            self._out[state] += (pattern_id,)
+
+        # breadth first, so the failure link of a state's parent is always known
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                fallback = self._goto[fallback].get(char, 0)
+
+                self._fail[next_state] = fallback
+                self._out[next_state] += self._out[fallback]
+
+    def search(self, text: str) -> Set[int]:
+        """Return the IDs (positions in the list given to the constructor) of all non-empty
+        patterns that occur in `text`.
+        """
+
+        goto, fail, out = self._goto, self._fail, self._out
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+
+class CompiledFilter:
+    """The guild's filter word list compiled for matching against normalized text.
+
+    A filter word that isn't a false positive triggers if it occurs anywhere in the folded text,
+    the text without whitespace or the text without whitespace and punctuation, or (unless
+    `match_stripped_words` is False, like for raid phrases) if the word with its own whitespace
+    removed occurs in the latter. A false positive word only triggers if it's one of the
+    whitespace separated tokens of the folded text.
+
+    Regex and glob entries trigger if they match anywhere in one of the three variants,
+    or if they're false positives, if they match one of the tokens as a whole. They are all
+    combined into one case insensitive pattern, so texts that match none of them (nearly all
+    texts) are dealt with in one search per variant. Entries that fail validate_pattern or
+    would exceed MAX_COMBINED_PATTERN_LENGTH are left out and listed in `rejected`.
+    Matching them is limited to PATTERN_TIME_BUDGET per text, past it only the entries
+    that were found to match in time count as triggered, and the match is reported as
+    incomplete.
+    """
+
+    def __init__(self, words, match_stripped_words: bool = True):
+        # kept so callers can tell whether the list this was compiled from is still current
+        self.source = words
+        self.words = list(words)
+        # (word, reason) of the regex and glob entries that were left out
+        self.rejected = []
+        # (index of the word, its compiled pattern)
+        self._expressions = []
+        expression_sources = []
+
+        patterns = {}
+        # pattern ID -> indices of words that trigger if the pattern is in any variant
+        self._any_variant = []
+        # pattern ID -> indices of words that trigger if the pattern is in the stripped variant
+        self._stripped_variant = []
+        # lowercased false positive word -> indices of words that trigger on this token
+        self._tokens = {}
+        # indices of words that are whitespace only, which every text contains
+        self._always = []
+
+        def pattern_id(pattern):
+            if pattern not in patterns:
+                patterns[pattern] = len(patterns)
+                self._any_variant.append([])
+                self._stripped_variant.append([])
+            return patterns[pattern]
+
+        for i, word in enumerate(self.words):
+            kind = getattr(word, "kind", LITERAL)
+            if kind != LITERAL:
+                source = pattern_source(word.word, kind)
+                try:
+                    validate_pattern(source)
+                    if sum(len(other) + 5 for other in expression_sources) + len(source) > MAX_COMBINED_PATTERN_LENGTH:
+                        raise PatternError("The filter list's patterns are over their combined length budget.")
+                except PatternError as e:
+                    self.rejected.append((word, str(e)))
+                    continue
+
+                expression_sources.append(source)
+                self._expressions.append((i, regex.compile(source, regex.IGNORECASE)))
+                continue
+
+            lowercase = word.word.lower()
+            if word.false_positive:
+                self._tokens.setdefault(lowercase, []).append(i)
+                continue
+
+            without_spaces = "".join(lowercase.split())
+            if not lowercase or (match_stripped_words and not without_spaces):
+                self._always.append(i)
+                continue
+
+            self._any_variant[pattern_id(lowercase)].append(i)
+            if match_stripped_words and without_spaces != lowercase:
+                self._stripped_variant[pattern_id(without_spaces)].append(i)
+
+        self._automaton = AhoCorasick(patterns)
+        self._combined = regex.compile("|".join(f"(?:{source})" for source in expression_sources), regex.IGNORECASE) if expression_sources else None
+        # how many texts ran out of PATTERN_TIME_BUDGET
+        self.timeouts = 0
+
+    def match(self, folded: str, without_spaces: str, without_punctuation: str, tokens: Iterable[str]) -> Tuple[List[int], bool]:
+        """Find the filter words that occur in a text, given its normalized variants.
+
+        Parameters
+        ----------
+        folded : str
+            The lowercased text folded to ASCII
+        without_spaces : str
+            `folded` without any whitespace
+        without_punctuation : str
+            `without_spaces` without any punctuation
+        tokens : Iterable[str]
+            `folded` split on whitespace
+
+        Returns
+        -------
+        Tuple[List[int], bool]
+            Indices into `words` of the triggered words, in filter list order, and whether
+            every entry was checked. If the regex and glob entries ran out of their time
+            budget, some of them may match without being in the list.
+        """
+
+        search = self._automaton.search
+        found = search(folded)
+        if without_spaces != folded:
+            found |= search(without_spaces)
+        found_stripped = found if without_punctuation == without_spaces else search(without_punctuation)
+
+        triggered = set(self._always)
+        for pattern in found | found_stripped:
+            triggered.update(self._any_variant[pattern])
+        for pattern in found_stripped:
+            triggered.update(self._stripped_variant[pattern])
+        for token in tokens:
+            triggered.update(self._tokens.get(token, ()))
+
+        complete = True
+        if self._combined is not None:
+            matched, complete = self._match_expressions(folded, without_spaces, without_punctuation, tokens)
+            triggered.update(matched)
+
+        return sorted(triggered), complete
+
+    def _match_expressions(self, folded: str, without_spaces: str, without_punctuation: str, tokens: Iterable[str]) -> Tuple[Set[int], bool]:
+        # the GIL is released while matching, so this can run on another thread than the event loop.
+        # The combined pattern gets half of the time budget, the entries the rest. Entries that
+        # couldn't be checked before it ran out don't count as triggered, a slow text must not
+        # get its author punished for entries that might not even match.
+        start = time.monotonic()
+
+        def matches(expression, texts, method: str, deadline: float) -> bool:
+            for text in texts:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError
+                if getattr(expression, method)(text, concurrent=True, timeout=remaining):
+                    return True
+            return False
+
+        variants = (folded, without_spaces, without_punctuation)
+        try:
+            if not matches(self._combined, variants, "search", start + PATTERN_TIME_BUDGET / 2):
+                return set(), True
+        except TimeoutError:
+            pass
+
+        # at least one of them matches (or we couldn't tell in time), find out which
+        deadline = time.monotonic() + PATTERN_TIME_BUDGET / 2
+        triggered = set()
+        for i, expression in self._expressions:
+            try:
+                if self.words[i].false_positive:
+                    if matches(expression, tokens, "fullmatch", deadline):
+                        triggered.add(i)
+                elif matches(expression, variants, "search", deadline):
+                    triggered.add(i)
+            except TimeoutError:
+                self.timeouts += 1
+                return triggered, False
+        return triggered, True
+
+
+class HitCounter:
+    """Counts how often each entry of a filter list triggered, and when it last did,
+    until the counts are drained to be written to the database.
+    Entries are identified by their word, so the counts survive recompiling the list.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # word -> [hits, timestamp of the last hit]
+        self._hits = {}
+
+    def record(self, words) -> None:
+        now = time.time()
+        with self._lock:
+            for word in words:
+                entry = self._hits.get(word.word)
+                if entry is None:
+                    self._hits[word.word] = [1, now]
+                else:
+                    entry[0] += 1
+                    entry[1] = now
+
+    def drain(self) -> dict:
+        """Return the counts since the last drain, and reset them.
+
+        Returns
+        -------
+        dict
+            Maps each word that triggered to a (hits, timestamp of the last hit) tuple.
+        """
+
+        with self._lock:
+            hits, self._hits = self._hits, {}
+        return {word: tuple(entry) for word, entry in hits.items()}
+
+    def restore(self, hits: dict) -> None:
+        """Add counts returned by drain back, e.g. because writing them failed."""
+
+        with self._lock:
+            for word, (count, last_hit) in hits.items():
+                entry = self._hits.setdefault(word, [0, last_hit])
+                entry[0] += count
+                entry[1] = max(entry[1], last_hit)
+
+    def __len__(self) -> int:
+        return len(self._hits)
+
+
+class LeveledFilter:
+    """The filter word list with a separate CompiledFilter for each permission level.
+    Each of them only contains the words that the level can't bypass, so matching
+    needs no permission checks per word.
+
+    If a `verdict_cache` is given, the result of `find` is remembered per normalized text
+    and effective permission level, so the same text sent again skips matching entirely.
+    Entries are keyed by `version`, which is new for every LeveledFilter, so a changed
+    word list never serves verdicts of the old one. Whether a list changed should be
+    decided by comparing `fingerprint`s.
+
+    If a `hit_counter` is given, every word `find` returns is recorded in it.
+
+    If an `on_timeout` callback is given, it's called with the permission level whenever the
+    regex and glob entries ran out of PATTERN_TIME_BUDGET on a text. Such verdicts only have
+    the entries that were found in time and are never cached.
+    """
+
+    def __init__(self, words, match_stripped_words: bool = True, verdict_cache=None, hit_counter: HitCounter = None,
+                 on_timeout: Callable[[int], None] = None):
+        # kept so callers can tell whether the list this was compiled from is still current
+        self.source = words
+        self.words = list(words)
+        self.fingerprint = fingerprint(self.words)
+        self.match_stripped_words = match_stripped_words
+        self.verdict_cache = verdict_cache
+        self.hit_counter = hit_counter
+        self.on_timeout = on_timeout
+        # regex and glob entries can take a while to match, see CompiledFilter
+        self.has_patterns = any(getattr(word, "kind", LITERAL) != LITERAL for word in self.words)
+        self.version = next(_versions)
+        self._by_level = {}
+        self._by_size = {}
+
+    def for_level(self, level: int) -> CompiledFilter:
+        """Return the compiled filter for members of permission level `level`,
+        compiling it on first use.
+        """
+
+        compiled = self._by_level.get(level)
+        if compiled is None:
+            words = [word for word in self.words if word.bypass > level]
+            # the word lists of higher levels are subsets of the lower ones,
+            # so lists of the same length are the same list and can share the automaton
+            compiled = self._by_size.get(len(words))
+            if compiled is None:
+                compiled = self._by_size[len(words)] = CompiledFilter(words, self.match_stripped_words)
+            self._by_level[level] = compiled
+        return compiled
+
+    def find(self, normalized, level: int) -> list:
+        """Find the words a member of permission level `level` triggers with a text.
+
+        Parameters
+        ----------
+        normalized : NormalizedText
+            The normalized text, see utils.mod.normalize
+        level : int
+            Permission level of the author of the text
+
+        Returns
+        -------
+        list
+            The triggered words in filter list order, or just the first notify word if any
+            of them is one.
+        """
+
+        if not normalized.folded:
+            return []
+
+        compiled = self.for_level(level)
+        if self.verdict_cache is not None:
+            # levels that share a compiled filter share verdicts, too
+            key = (self.version, hashlib.blake2b(normalized.folded.encode(), digest_size=16).digest(), len(compiled.words))
+            cached = self.verdict_cache.get(key)
+            if cached is not None:
+                words_found = list(cached)
+                if words_found and self.hit_counter is not None:
+                    self.hit_counter.record(words_found)
+                return words_found
+
+        words_found, complete = self._find(compiled, normalized)
+        if not complete:
+            if self.on_timeout is not None:
+                self.on_timeout(level)
+        elif self.verdict_cache is not None:
+            self.verdict_cache.set(key, tuple(words_found))
+        if words_found and self.hit_counter is not None:
+            self.hit_counter.record(words_found)
+        return words_found
+
+    def _find(self, compiled: CompiledFilter, normalized) -> Tuple[list, bool]:
+        triggered, complete = compiled.match(*normalized)
+        words_found = []
+        for i in triggered:
+            word = compiled.words[i]
+            if word.notify:
+                return [word], complete
+
+            words_found.append(word)
+        return words_found, complete
@@ -41,7 +41,6 @@ async def mute(ctx, member, dur_seconds=None, reason="No reason."):
 
     db_guild = guild_service.get_guild()
     case = Case(
-        _id=db_guild.case_id,
         _type="MUTE",
         date=now,
         mod_id=ctx.author.id,
@@ -59,8 +58,8 @@ async def mute(ctx, member, dur_seconds=None, reason="No reason."):
     except Exception:
         return
 
-    guild_service.inc_caseid()
-    user_service.add_case(member.id, case)
+    case._id = await guild_service.next_case_id()
+    await user_service.add_case(member.id, case)
 
     log = prepare_mute_log(ctx.author, member, case)
     await ctx.send(embed=log)
@@ -97,15 +96,14 @@ async def unmute(ctx, member, reason: str = "No reason.") -> None:
         pass
 
     case = Case(
-        _id=db_guild.case_id,
         _type="UNMUTE",
         mod_id=ctx.author.id,
         mod_tag=str(ctx.author),
         reason=reason,
     )
 
-    guild_service.inc_caseid()
-    user_service.add_case(member.id, case)
+    case._id = await guild_service.next_case_id()
+    await user_service.add_case(member.id, case)
 
     log = prepare_unmute_log(ctx.author, member, case)
 
@@ -135,7 +133,7 @@ async def ban(ctx, user, reason="No reason.", extra_text: str = ""):
 
     member_is_external = isinstance(user, discord.User)
 
-    log = await add_ban_case(ctx, user, reason, db_guild)
+    log = await add_ban_case(ctx, user, reason)
 
     if not member_is_external:
         await notify_user(user, f"You have been banned from {ctx.guild.name}. {extra_text}", log)
@@ -156,7 +154,6 @@ async def warn(ctx, user, reason):
 
     # prepare the case object for database
     case = Case(
-        _id=db_guild.case_id,
         _type="WARN",
         mod_id=ctx.author.id,
         mod_tag=str(ctx.author),
@@ -164,13 +161,10 @@ async def warn(ctx, user, reason):
         punishment="WARN"
     )
 
-    # increment case ID in database for next available case ID
-    guild_service.inc_caseid()
+    # reserve the next available case ID
+    case._id = await guild_service.next_case_id()
     # add new case to DB
-    user_service.add_case(user.id, case)
-
-    # fetch latest document about user from DB
-    db_user = user_service.get_user(user.id)
+    await user_service.add_case(user.id, case)
 
     # prepare log embed, send to #public-mod-logs, user, channel where invoked
     log = prepare_warn_log(ctx.author, user, case)
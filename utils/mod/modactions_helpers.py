@@ -11,7 +11,7 @@ from utils.mod.mod_logs import prepare_ban_log, prepare_kick_log
 from utils.config import cfg
 
 
-async def add_kick_case(ctx: ChromeyContext, user, reason, db_guild):
+async def add_kick_case(ctx: ChromeyContext, user, reason):
     """Adds kick case to user
 
     Parameters
@@ -22,23 +22,20 @@ async def add_kick_case(ctx: ChromeyContext, user, reason, db_guild):
         "Member who was kicked"
     reason : str
         "Reason member was kicked"
-    db_guild
-        "Guild DB"
 
     """
     # prepare case for DB
     case = Case(
-        _id=db_guild.case_id,
         _type="KICK",
         mod_id=ctx.author.id,
         mod_tag=str(ctx.author),
         reason=reason,
     )
 
-    # increment max case ID for next case
-    guild_service.inc_caseid()
+    # reserve the next available case ID
+    case._id = await guild_service.next_case_id()
     # add new case to DB
-    user_service.add_case(user.id, case)
+    await user_service.add_case(user.id, case)
 
     return prepare_kick_log(ctx.author, user, case)
 
@@ -116,7 +113,7 @@ async def submit_mod_log(ctx: ChromeyContext, db_guild: Guild, user: Union[disco
         await modlogs_chan.send(embed=log)
 
 
-async def add_ban_case(ctx: ChromeyContext, user: discord.User, reason, db_guild: Guild = None):
+async def add_ban_case(ctx: ChromeyContext, user: discord.User, reason):
     """Adds ban case to user
 
     Parameters
@@ -127,13 +124,10 @@ async def add_ban_case(ctx: ChromeyContext, user: discord.User, reason, db_guild
         "Member who was banned"
     reason : str
         "Reason member was banned"
-    db_guild
-        "Guild DB"
 
     """
     # prepare the case to store in DB
     case = Case(
-        _id=db_guild.case_id,
         _type="BAN",
         mod_id=ctx.author.id,
         mod_tag=str(ctx.author),
@@ -141,9 +135,9 @@ async def add_ban_case(ctx: ChromeyContext, user: discord.User, reason, db_guild
         reason=reason,
     )
 
-    # increment DB's max case ID for next case
-    guild_service.inc_caseid()
+    # reserve the next available case ID
+    case._id = await guild_service.next_case_id()
     # add case to db
-    user_service.add_case(user.id, case)
+    await user_service.add_case(user.id, case)
     # prepare log embed to send to #public-mod-logs, user and context
     return prepare_ban_log(ctx.author, user, case)
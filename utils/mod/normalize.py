@@ -0,0 +1,52 @@
+import string
+from typing import NamedTuple, Tuple
+
+from fold_to_ascii import fold
+from utils.cache import LRUCache
+
+# Cyrillic letters mapped to the Latin letters they look like, so they can't be used to dodge filters
+CYRILLIC_HOMOGLYPHS = str.maketrans(u"абвгдеёжзийклмнопрстуфхцчшщъыьэюяАБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯ",
+                                    u"abBrdeex3nnKnmHonpcTyoxu4wwbbbeoRABBrDEEX3NNKNMHONPCTyOXU4WWbbbEOR")
+STRIP_PUNCTUATION = str.maketrans('', '', string.punctuation)
+
+
+class NormalizedText(NamedTuple):
+    """The variants of a text that filters are matched against."""
+
+    folded: str
+    """lowercase, homoglyphs replaced and folded to ASCII"""
+    without_spaces: str
+    """`folded` with all whitespace removed"""
+    without_punctuation: str
+    """`without_spaces` with all punctuation removed"""
+    tokens: Tuple[str, ...]
+    """`folded` split on whitespace"""
+
+
+def normalize(text: str) -> NormalizedText:
+    """Compute every normalized variant of `text` in one go.
+    """
+
+    folded = fold(text.translate(CYRILLIC_HOMOGLYPHS).lower()).lower()
+    tokens = tuple(folded.split())
+    without_spaces = "".join(tokens)
+    return NormalizedText(folded, without_spaces, without_spaces.translate(STRIP_PUNCTUATION), tokens)
+
+
+# message ID -> (content that was normalized, NormalizedText)
+_message_cache = LRUCache(maxsize=2048, ttl=60)
+
+
+def normalize_message(message) -> NormalizedText:
+    """Normalize the content of a message. The result is remembered by message ID, so the
+    listeners that look at the same message only do the work once. An edited message is
+    normalized again.
+    """
+
+    cached = _message_cache.get(message.id)
+    if cached is not None and cached[0] == message.content:
+        return cached[1]
+
+    normalized = normalize(message.content)
+    _message_cache.set(message.id, (message.content, normalized))
+    return normalized
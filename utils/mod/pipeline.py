@@ -0,0 +1,153 @@
+import time
+from functools import cached_property
+from typing import Awaitable, Callable, Iterable
+
+import discord
+from data.model.guild import Guild
+from data.services.guild_service import guild_service
+from utils.cache import LRUCache
+from utils.config import cfg
+from utils.mod.normalize import NormalizedText, normalize_message
+from utils.permissions.permissions import permissions
+
+# the order in which stages run, no matter which cog registered them first
+STAGE_ORDER = [
+    "bad_words",
+    "invites",
+    "ping_spam",
+    "raid_phrases",
+    "message_spam",
+    "scam_links",
+]
+
+
+class ModerationContext:
+    """Everything the stages of the pipeline need to know about a message.
+    It's computed once per message and shared by all stages.
+    """
+
+    def __init__(self, message: discord.Message, level: int):
+        self.message = message
+        self.level = level
+        self.db_guild: Guild = guild_service.get_guild()
+
+    @cached_property
+    def normalized(self) -> NormalizedText:
+        return normalize_message(self.message)
+
+
+class Stage:
+    """A single check of the moderation pipeline.
+
+    Stages belong to a chain. Once a stage triggers (i.e. its check returns True, meaning it
+    dealt with the message), the remaining stages of the same chain are skipped.
+    Members whose permission level is at least `bypass` skip the stage.
+    """
+
+    def __init__(self, name: str, chain: str, check: Callable[[ModerationContext], Awaitable[bool]], bypass: int):
+        self.name = name
+        self.chain = chain
+        self.check = check
+        self.bypass = bypass
+
+        self.calls = 0
+        self.triggers = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    @property
+    def average_time(self) -> float:
+        return self.total_time / self.calls if self.calls else 0.0
+
+
+class ModerationPipeline:
+    """Runs every incoming message through the moderation checks in a single pass.
+    The guild, bot and permission checks are done once, instead of once per listener.
+    """
+
+    def __init__(self):
+        self.stages = []
+        # (message ID, content) -> {stage name: triggered}, so that e.g. the edit Discord sends
+        # when it adds a link embed doesn't run the checks on the same content again
+        self._results = LRUCache(maxsize=2048, ttl=300)
+
+    def add_stage(self, name: str, chain: str, check: Callable[[ModerationContext], Awaitable[bool]], bypass: int) -> None:
+        """Register a check with the pipeline, replacing any previous stage with that name
+        (for example when the cog that registered it is reloaded).
+
+        Parameters
+        ----------
+        name : str
+            Name of the stage, must be in STAGE_ORDER
+        chain : str
+            Chain the stage belongs to
+        check : Callable[[ModerationContext], Awaitable[bool]]
+            Coroutine function that checks a message, and acts on it if necessary.
+            Returns True if it acted on the message.
+        bypass : int
+            Permission level needed to skip this stage
+        """
+
+        if name not in STAGE_ORDER:
+            raise ValueError(f"Unknown moderation stage {name}")
+
+        self.stages = [stage for stage in self.stages if stage.name != name]
+        self.stages.append(Stage(name, chain, check, bypass))
+        self.stages.sort(key=lambda stage: STAGE_ORDER.index(stage.name))
+
+    async def run(self, message: discord.Message, chains: Iterable[str] = None) -> dict:
+        """Run a message through the stages of the pipeline.
+
+        Parameters
+        ----------
+        message : discord.Message
+            The message to check
+        chains : Iterable[str], optional
+            Only run the stages of these chains, by default all of them
+
+        Returns
+        -------
+        dict
+            Maps the name of each stage that was run on this message to whether it triggered.
+        """
+
+        if message.guild is None or message.guild.id != cfg.guild_id:
+            return {}
+        if message.author.bot:
+            return {}
+
+        member = message.guild.get_member(message.author.id)
+        if member is None:
+            return {}
+        message.author = member
+
+        key = (message.id, message.content)
+        results = self._results.get(key)
+        if results is None:
+            results = {}
+            self._results.set(key, results)
+
+        ctx = ModerationContext(message, permissions.get_level(message.guild, member))
+        finished_chains = set()
+        for stage in self.stages:
+            if chains is not None and stage.chain not in chains:
+                continue
+            if stage.chain in finished_chains or ctx.level >= stage.bypass:
+                continue
+
+            triggered = results.get(stage.name)
+            if triggered is None:
+                start = time.perf_counter()
+                triggered = bool(await stage.check(ctx))
+                elapsed = time.perf_counter() - start
+
+                stage.calls += 1
+                stage.triggers += triggered
+                stage.total_time += elapsed
+                stage.max_time = max(stage.max_time, elapsed)
+                results[stage.name] = triggered
+
+            if triggered:
+                finished_chains.add(stage.chain)
+
+        return results
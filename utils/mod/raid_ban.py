@@ -0,0 +1,279 @@
+import asyncio
+import time
+from datetime import datetime
+
+import discord
+from data.model.case import Case
+from data.services.guild_service import guild_service
+from data.services.user_service import user_service
+from utils.logger import logger
+from utils.mod.mod_logs import prepare_ban_log
+
+RAID_PHRASE_REASON = "Raid phrase detected"
+
+
+class BanJob:
+    def __init__(self, user: discord.Member, reason: str, dm_user: bool):
+        self.user = user
+        self.reason = reason
+        self.dm_user = dm_user
+        self.case = None
+        self.banned = False
+        self.done = asyncio.get_running_loop().create_future()
+
+
+class RaidBanExecutor:
+    """Bans raid accounts from a queue, with a few bans in flight at a time.
+
+    The cases of everyone waiting in the queue (up to `batch_size`) are handled together:
+    one database operation reserves their case IDs, and once the whole batch is done, one
+    bulk_write adds the cases of the accounts that were actually banned. In between, each
+    ban optionally DMs the user, bans them (and unbans them again for raid phrases, to
+    delete their messages) and posts to the modlogs, which are mostly
+    requests on different rate limit buckets. Doing these for `workers` accounts at once
+    lets a mass ban finish about as fast as the ban route allows, while the HTTP client
+    still queues requests on the same bucket and waits out 429s. Keeping the number of
+    workers small keeps the bot well below the global rate limit.
+
+    Accounts that are in the BanCache are skipped, and they're added to it as soon as they
+    are queued, so detecting the same account again while it waits does nothing. If banning
+    them fails, they're taken out of it again and no case is written, so a later detection
+    can try again. DMs are sent only if they go through within `dm_timeout` seconds, a slow
+    DM never holds up the ban, and failing to post to the modlogs doesn't fail the ban.
+
+    If more than `progress_threshold` accounts are queued in one burst, the progress is
+    posted in the reports channel and kept up to date until the queue is empty.
+    """
+
+    def __init__(self, bot, workers: int = 4, batch_size: int = 100, dm_timeout: float = 3.0, progress_threshold: int = 10, progress_interval: float = 5.0):
+        self.bot = bot
+        self.workers = workers
+        self.batch_size = batch_size
+        self.dm_timeout = dm_timeout
+        self.progress_threshold = progress_threshold
+        self.progress_interval = progress_interval
+
+        self.queue = None
+        self.slots = None
+        self.dispatcher = None
+        self.in_flight = set()
+        # tasks that write the cases of a batch once it's done, these aren't cancelled by stop
+        self.case_writers = set()
+        # jobs that were submitted and haven't finished yet
+        self.unfinished = set()
+        self.progress_task = None
+
+        # counts of the current burst, reset once the queue is drained
+        self.queued = 0
+        self.banned = 0
+        self.failed = 0
+        self.skipped = 0
+        self.burst_started = None
+
+    def submit(self, user: discord.Member, reason: str = RAID_PHRASE_REASON, dm_user: bool = False):
+        """Queue a user to be banned, unless they're already banned or queued.
+
+        Parameters
+        ----------
+        user : discord.Member
+            The user to ban
+        reason : str
+            Reason for the case
+        dm_user : bool
+            Whether to tell the user why they were banned
+
+        Returns
+        -------
+        Optional[asyncio.Future]
+            Resolves once the user was banned (or banning them failed), None if the user was skipped.
+        """
+
+        if self.bot.ban_cache.is_banned(user.id):
+            self.skipped += 1
+            return None
+        self.bot.ban_cache.ban(user.id)
+
+        if self.queue is None:
+            self.queue = asyncio.Queue()
+            self.slots = asyncio.Semaphore(self.workers)
+            self.dispatcher = asyncio.ensure_future(self.dispatch())
+
+        if self.queue.empty() and self.queued == self.banned + self.failed:
+            # nothing in flight, this is the start of a new burst
+            self.queued = self.banned = self.failed = self.skipped = 0
+            self.burst_started = time.monotonic()
+
+        job = BanJob(user, reason, dm_user)
+        self.unfinished.add(job)
+        self.queue.put_nowait(job)
+        self.queued += 1
+
+        if self.queued > self.progress_threshold and self.progress_task is None:
+            self.progress_task = asyncio.ensure_future(self.report_progress(user.guild))
+        return job.done
+
+    async def ban(self, user: discord.Member, reason: str = RAID_PHRASE_REASON, dm_user: bool = False) -> None:
+        """Queue a user to be banned and wait until that's done, see `submit`."""
+
+        done = self.submit(user, reason, dm_user)
+        if done is not None:
+            await asyncio.shield(done)
+
+    def stop(self) -> None:
+        """Cancel the bans in progress. Bans still in the queue are dropped, and their
+        users are taken out of the BanCache again so they can be detected again later.
+        The cases of the bans that already went through are still written.
+        """
+
+        for task in [self.dispatcher, self.progress_task, *self.in_flight]:
+            if task is not None:
+                task.cancel()
+        for job in self.unfinished:
+            if not job.banned:
+                self.bot.ban_cache.unban(job.user.id)
+            if not job.done.done():
+                job.done.set_result(None)
+        self.unfinished.clear()
+        self.dispatcher = None
+        self.queue = None
+
+    async def dispatch(self):
+        while True:
+            jobs = [await self.queue.get()]
+            while len(jobs) < self.batch_size and not self.queue.empty():
+                jobs.append(self.queue.get_nowait())
+
+            try:
+                await self.prepare_cases(jobs)
+            except Exception as e:
+                for job in jobs:
+                    self.finish(job, e)
+                continue
+
+            writer = asyncio.ensure_future(self.write_cases(jobs))
+            self.case_writers.add(writer)
+            writer.add_done_callback(self.case_writers.discard)
+
+            for job in jobs:
+                # bans queued while we wait here end up in the next batch
+                await self.slots.acquire()
+                task = asyncio.ensure_future(self.run(job))
+                self.in_flight.add(task)
+                task.add_done_callback(self.in_flight.discard)
+
+    async def prepare_cases(self, jobs: list):
+        first_id = await guild_service.allocate_case_ids(len(jobs))
+        for offset, job in enumerate(jobs):
+            job.case = Case(
+                _id=first_id + offset,
+                _type="BAN",
+                date=datetime.now(),
+                mod_id=self.bot.user.id,
+                mod_tag=str(self.bot.user),
+                punishment="PERMANENT",
+                reason=job.reason
+            )
+
+    async def write_cases(self, jobs: list):
+        """Wait until every job of a batch is done, then add the cases of the users that were banned.
+        The case IDs of failed bans are left unused.
+        """
+
+        await asyncio.gather(*(job.done for job in jobs))
+        banned = [(job.user.id, job.case) for job in jobs if job.banned]
+        if not banned:
+            return
+
+        try:
+            await user_service.add_cases(banned)
+        except Exception as e:
+            logger.error(f"Failed to write the cases of {len(banned)} raid bans: {e}")
+
+    async def run(self, job: BanJob):
+        try:
+            await self.execute(job)
+        except Exception as e:
+            self.finish(job, e)
+        else:
+            self.finish(job)
+        finally:
+            self.slots.release()
+
+    def finish(self, job: BanJob, error: Exception = None):
+        self.unfinished.discard(job)
+        if error is None:
+            self.banned += 1
+        else:
+            self.failed += 1
+            # let a later detection try again
+            self.bot.ban_cache.unban(job.user.id)
+            logger.error(f"Failed to ban {job.user} ({job.user.id}) for raid: {error}")
+
+        if not job.done.done():
+            job.done.set_result(None)
+        self.queue.task_done()
+
+    async def execute(self, job: BanJob):
+        user = job.user
+        db_guild = guild_service.get_guild()
+        log = prepare_ban_log(self.bot.user, user, job.case)
+
+        if job.dm_user:
+            if job.reason == RAID_PHRASE_REASON:
+                text = "We detected that your account was hacked as it posted a scam text in our server. We have banned and unbanned you to delete all of your scam messages. Please secure your account, then you can rejon using https://discord.gg/chromeos."
+            else:
+                text = f"You were banned from {user.guild.name}.\n\nThis action was performed automatically. If you think this was a mistake, please send a message here: https://www.reddit.com/message/compose?to=%2Fr%2chromeos"
+
+            try:
+                await asyncio.wait_for(user.send(text, embed=log), self.dm_timeout)
+            except Exception:
+                pass
+
+        if user.guild.get_member(user.id) is not None:
+            await user.ban(reason="Raid")
+        else:
+            await user.guild.ban(discord.Object(id=user.id), reason="Raid")
+        job.banned = True
+
+        # the ban went through, anything failing from here on doesn't make it a failed ban
+        if job.reason == RAID_PHRASE_REASON:
+            try:
+                await user.guild.unban(discord.Object(id=user.id), reason="Raid")
+            except Exception as e:
+                logger.error(f"Failed to unban {user} ({user.id}) after a raid phrase ban: {e}")
+
+        public_logs = user.guild.get_channel(db_guild.channel_modlogs)
+        if public_logs:
+            log.remove_author()
+            log.set_thumbnail(url=user.display_avatar)
+            try:
+                await public_logs.send(embed=log)
+            except Exception as e:
+                logger.error(f"Failed to post the raid ban of {user} ({user.id}) to the modlogs: {e}")
+
+    def progress_embed(self, finished: bool = False) -> discord.Embed:
+        embed = discord.Embed(title="Raid bans finished" if finished else "Banning raid accounts")
+        embed.color = discord.Color.green() if finished else discord.Color.orange()
+        embed.add_field(name="Banned", value=f"{self.banned} of {self.queued}")
+        embed.add_field(name="Failed", value=self.failed)
+        embed.add_field(name="Already banned", value=self.skipped)
+        embed.set_footer(text=f"{time.monotonic() - self.burst_started:.0f} seconds so far" if not finished
+                         else f"Took {time.monotonic() - self.burst_started:.0f} seconds")
+        return embed
+
+    async def report_progress(self, guild: discord.Guild):
+        try:
+            reports_channel = guild.get_channel(guild_service.get_guild().channel_reports)
+            if reports_channel is None:
+                await self.queue.join()
+                return
+
+            message = await reports_channel.send(embed=self.progress_embed())
+            drained = asyncio.ensure_future(self.queue.join())
+            while not drained.done():
+                await asyncio.wait({drained}, timeout=self.progress_interval)
+                await message.edit(embed=self.progress_embed(finished=drained.done()))
+        except Exception as e:
+            logger.error(f"Failed to report raid ban progress: {e}")
+        finally:
+            self.progress_task = None
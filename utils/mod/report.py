@@ -28,14 +28,14 @@ async def report(bot: discord.Client, message: discord.Message, word: str, invit
     db_guild = guild_service.get_guild()
     channel = message.guild.get_channel(db_guild.channel_reports)
 
-    ping_string = prepare_ping_string(db_guild, message)
+    ping_string = await prepare_ping_string(db_guild, message)
     view = ReportActions(message.author)
 
     if invite:
-        embed = prepare_embed(message, word, title="Invite filter")
+        embed = await prepare_embed(message, word, title="Invite filter")
         report_msg = await channel.send(f"{ping_string}\nMessage contained invite: {invite}", embed=embed, view=view)
     else:
-        embed = prepare_embed(message, word)
+        embed = await prepare_embed(message, word)
         report_msg = await channel.send(ping_string, embed=embed, view=view)
 
     ctx = await bot.get_context(report_msg, cls=ChromeyOldContext)
@@ -63,7 +63,7 @@ async def manual_report(bot: discord.Client, mod: discord.Member, target: Union[
     else:
         view = ReportActions(target)
 
-    embed = prepare_embed(target, title="A moderator reported a member")
+    embed = await prepare_embed(target, title="A moderator reported a member")
     report_msg = await channel.send(ping_string, embed=embed, view=view)
 
     ctx = await bot.get_context(report_msg, cls=ChromeyOldContext)
@@ -88,10 +88,10 @@ async def report_raid_phrase(bot: discord.Client, message: discord.Message, doma
     db_guild = guild_service.get_guild()
     channel = message.guild.get_channel(db_guild.channel_reports)
 
-    ping_string = prepare_ping_string(db_guild, message)
+    ping_string = await prepare_ping_string(db_guild, message)
     view = RaidPhraseReportActions(message.author, domain)
 
-    embed = prepare_embed(
+    embed = await prepare_embed(
         message, domain, title=f"Possible new raid phrase detected\n{domain}")
     report_msg = await channel.send(ping_string, embed=embed, view=view)
 
@@ -102,10 +102,10 @@ async def report_raid_phrase(bot: discord.Client, message: discord.Message, doma
 async def report_spam(bot, msg, user, title):
     db_guild = guild_service.get_guild()
     channel = msg.guild.get_channel(db_guild.channel_reports)
-    ping_string = prepare_ping_string(db_guild, msg)
+    ping_string = await prepare_ping_string(db_guild, msg)
 
     view = SpamReportActions(user)
-    embed = prepare_embed(msg, title=title)
+    embed = await prepare_embed(msg, title=title)
 
     report_msg = await channel.send(ping_string, embed=embed, view=view)
 
@@ -128,7 +128,7 @@ async def report_raid(user, msg=None):
     await reports_channel.send(f"<@&{db_guild.role_moderator}>", embed=embed, allowed_mentions=discord.AllowedMentions(roles=True))
 
 
-def prepare_ping_string(db_guild, message):
+async def prepare_ping_string(db_guild, message):
     """Prepares modping string
 
     Parameters
@@ -145,14 +145,14 @@ def prepare_ping_string(db_guild, message):
     
     role = message.guild.get_role(db_guild.role_moderator)
     for member in role.members:
-        offline_ping = (user_service.get_user(member.id)).offline_report_ping
+        offline_ping = (await user_service.get_user(member.id)).offline_report_ping
         if member.status == discord.Status.online or offline_ping:
             ping_string += f"{member.mention} "
 
     return ping_string
 
 
-def prepare_embed(target: Union[discord.Message, discord.Member], word: str = None, title="Word filter"):
+async def prepare_embed(target: Union[discord.Message, discord.Member], word: str = None, title="Word filter"):
     """Prepares embed
 
     Parameters
@@ -170,8 +170,7 @@ def prepare_embed(target: Union[discord.Message, discord.Member], word: str = No
     else:
         member = target
 
-    user_info = user_service.get_user(member.id)
-    rd = user_service.rundown(member.id)
+    rd = await user_service.rundown(member.id)
     rd_text = ""
     for r in rd:
         rd_text += f"**{r._type}** - {r.punishment} - {r.reason} - {format_dt(r.date, style='R')}\n"
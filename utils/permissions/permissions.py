@@ -101,6 +101,38 @@ class Permissions:
 
         return self._permissions[level](guild, member)
 
+    def get_level(self, guild: discord.Guild, member: discord.Member) -> int:
+        """Computes the highest permission level a user given by `member` has in guild `guild`,
+        so that `get_level(guild, member) >= level` is the same as `has(guild, member, level)`.
+        Use this instead of several calls to `has` when checking one member against many levels.
+
+        Parameters
+        ----------
+        guild : discord.Guild
+            The guild to check
+        member : discord.Member
+            The member whose permissions we're checking
+
+        Returns
+        -------
+        int
+            The member's permission level, 0 to 5.
+
+        """
+
+        if guild.id != cfg.guild_id:
+            return 0
+        if member.id == cfg.guild_owner_id:
+            return 5
+        if member == guild.owner:
+            return 4
+
+        role_ids = {role.id for role in member.roles}
+        for level in (3, 2, 1):
+            if self._role_permission_mapping[level] in role_ids:
+                return level
+        return 0
+
     def level_role_list(self, level: int) -> List[int]:
         return []
         # if level == 0:
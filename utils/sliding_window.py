@@ -0,0 +1,85 @@
+from collections import deque
+
+
+class SlidingWindow:
+    """Counts events (e.g. joins) that happened within the last `window` seconds, and remembers
+    who caused them.
+
+    Events are kept in a ring buffer ordered by timestamp, so adding one and dropping the ones
+    that fell out of the window is O(1) amortized. Nothing is dropped before it expires, however
+    many events there are, so the keys returned by `keys` are exactly the ones inside the window.
+    Not thread safe, it's meant to be used from the event loop.
+    """
+
+    def __init__(self, window: float):
+        self.window = window
+        # (timestamp, key) of every event in the window, oldest first
+        self._events = deque()
+        # key -> number of its events in the window
+        self._counts = {}
+        # key -> value passed with its latest event
+        self._values = {}
+
+    def add(self, key, timestamp: float, value=None) -> int:
+        """Record an event and drop the ones that are no longer in the window.
+
+        Parameters
+        ----------
+        key : Hashable
+            Who caused the event, e.g. a member ID
+        timestamp : float
+            When the event happened, in seconds. Timestamps older than that of the last event
+            (e.g. of messages delivered out of order) are treated as if they were the same.
+        value : Any, optional
+            Stored alongside the key, e.g. the member object, see `items`
+
+        Returns
+        -------
+        int
+            How many events are in the window now, including this one.
+        """
+
+        if self._events and timestamp < self._events[-1][0]:
+            timestamp = self._events[-1][0]
+
+        self._events.append((timestamp, key))
+        self._counts[key] = self._counts.get(key, 0) + 1
+        self._values[key] = value
+        return self.expire(timestamp)
+
+    def expire(self, now: float) -> int:
+        """Drop the events that happened `window` or more seconds before `now`.
+
+        Returns
+        -------
+        int
+            How many events are left in the window.
+        """
+
+        events = self._events
+        cutoff = now - self.window
+        while events and events[0][0] <= cutoff:
+            _, key = events.popleft()
+            remaining = self._counts[key] - 1
+            if remaining:
+                self._counts[key] = remaining
+            else:
+                del self._counts[key]
+                del self._values[key]
+        return len(events)
+
+    def keys(self) -> list:
+        """Return the distinct keys of the events in the window."""
+
+        return list(self._counts)
+
+    def items(self) -> list:
+        """Return (key, value of its latest event) for the distinct keys of the events in the window."""
+
+        return list(self._values.items())
+
+    def __contains__(self, key) -> bool:
+        return key in self._counts
+
+    def __len__(self) -> int:
+        return len(self._events)
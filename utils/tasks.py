@@ -1,5 +1,4 @@
 import discord
-import os
 import random
 from datetime import datetime
 from apscheduler.executors.pool import ThreadPoolExecutor
@@ -9,7 +8,9 @@ from data.model.case import Case
 from data.services.guild_service import guild_service
 from data.services.user_service import user_service
 from utils.config import cfg
+from utils.database import db
 from utils.mod.mod_logs import prepare_unmute_log
+from pymongo import ReadPreference
 from pytz import utc
 
 executors = {
@@ -23,6 +24,15 @@ job_defaults = {
 BOT_GLOBAL = None
 
 
+class SharedClientJobStore(MongoDBJobStore):
+    """MongoDBJobStore for a client that is shared with the rest of the bot. The stock one
+    closes its client when the scheduler shuts down, this one leaves it open.
+    """
+
+    def shutdown(self):
+        pass
+
+
 class Tasks():
     """Job scheduler for unmute, using APScheduler"""
 
@@ -42,14 +52,13 @@ class Tasks():
         # logging.basicConfig()
         # logging.getLogger('apscheduler').setLevel(logging.DEBUG)
 
-        if os.environ.get("DB_CONNECTION_STRING") is None:
-            jobstores = {
-                'default': MongoDBJobStore(database="chromey", collection="jobs", host=os.environ.get("DB_HOST"), port=int(os.environ.get("DB_PORT"))),
-            }
-        else:
-            jobstores = {
-                'default': MongoDBJobStore(database="chromey", collection="jobs", host=os.environ.get("DB_CONNECTION_STRING")),
-            }
+        # share the bot's MongoClient instead of opening a second connection pool.
+        # jobs must never be read from a stale secondary, whatever DB_READ_PREFERENCE says
+        jobstore = SharedClientJobStore(database="chromey", collection="jobs", client=db.client)
+        jobstore.collection = jobstore.collection.with_options(read_preference=ReadPreference.PRIMARY)
+        jobstores = {
+            'default': jobstore,
+        }
 
         self.tasks = AsyncIOScheduler(
             jobstores=jobstores, executors=executors, job_defaults=job_defaults, event_loop=bot.loop, timezone=utc)
@@ -241,14 +250,13 @@ async def remove_timeout(id: int) -> None:
     db_guild = guild_service.get_guild()
 
     case = Case(
-        _id=db_guild.case_id,
         _type="UNMUTE",
         mod_id=BOT_GLOBAL.user.id,
         mod_tag=str(BOT_GLOBAL.user),
         reason="Temporary mute expired.",
     )
-    guild_service.inc_caseid()
-    user_service.add_case(id, case)
+    case._id = await guild_service.next_case_id()
+    await user_service.add_case(id, case)
 
     guild = BOT_GLOBAL.get_guild(cfg.guild_id)
     user: discord.Member = guild.get_member(id)
@@ -411,7 +419,7 @@ async def end_giveaway(channel_id: int, message_id: int, winners: int) -> None:
             mentions.append(member.mention)
             winner_ids.append(member.id)
 
-    g = guild_service.get_giveaway(_id=message.id)
+    g = await guild_service.get_giveaway(_id=message.id)
     g.entries = reacted_ids
     g.is_ended = True
     g.previous_winners = winner_ids